@@ -6,7 +6,6 @@ Run this @ start of EC2 processing jobs.
 """
 import os
 import subprocess
-import time
 import signal
 import sys
 
@@ -55,12 +54,10 @@ def main():
     print("Press Ctrl+C to cancel shutdown")
     print("Or run: sudo shutdown -c")
     
-    # Keep script running to maintain signal handlers
-    try:
-        while True:
-            time.sleep(60)
-    except KeyboardInterrupt:
-        signal_handler(signal.SIGINT, None)
+    # Keep script running to maintain signal handlers.
+    # signal.pause() blocks with zero wakeups until a signal arrives
+    # (the handlers above exit the process).
+    signal.pause()
 
 
 if __name__ == "__main__":
@@ -5,61 +5,252 @@ Shared utilities for AWS EC2 functions in the Torque pipeline.
 Contains common imports, helper functions, and utilities used across
 init_job.py, refine_mask.py, run_sam2.py, and run_colmap.py.
 """
+import functools
 import os
 import sys
 import subprocess
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+# Keep library-internal thread pools at one thread: parallelism is owned by
+# the outer ThreadPoolExecutors, and letting OpenMP/BLAS spawn per-core pools
+# on top of them oversubscribes the 4-vCPU workers. Must be set before the
+# numpy/cv2 imports below pick them up. Record which vars *we* pinned so
+# subprocess_env() can strip them again - colmap/brush/ffmpeg are heavily
+# OpenMP-threaded and must not inherit the single-thread cap.
+_THREAD_PIN_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+_OUR_THREAD_PINS = [v for v in _THREAD_PIN_VARS if v not in os.environ]
+for _v in _OUR_THREAD_PINS:
+    os.environ[_v] = "1"
+
 # Common imports used across AWS functions
 import boto3
+from boto3.s3.transfer import TransferConfig
 import cv2
 import numpy as np
 from urllib.parse import urlparse
 
-def run(cmd, **kw):
+# Shared S3 client + transfer tuning (multipart chunks, high concurrency).
+# One client per process avoids re-resolving credentials/config on every call.
+_s3 = boto3.client("s3")
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=max(20, 4 * (os.cpu_count() or 1)),
+    use_threads=True,
+)
+# For per-file transfers inside the directory helpers' thread pools: the
+# outer pool already provides the concurrency, so keep each transfer
+# single-threaded to avoid workers x parts thread explosion.
+_PER_FILE_CONFIG = TransferConfig(
+    multipart_chunksize=16 * 1024 * 1024,
+    use_threads=False,
+)
+
+def _parse_s3_url(s3_pref: str) -> tuple:
+    """
+    Split s3://bucket/prefix into (bucket, key_prefix).
+    """
+    parsed = urlparse(s3_pref)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+def subprocess_env() -> dict:
     """
-    Execute a shell command and print output.
+    Environment for spawning native binaries: the in-process thread pins
+    above are dropped (only the ones this module set - operator-provided
+    values pass through), so colmap, brush, and ffmpeg get their full
+    OpenMP/ceres thread counts back.
+    """
+    env = os.environ.copy()
+    for v in _OUR_THREAD_PINS:
+        env.pop(v, None)
+    return env
+
+def run(cmd, timeout=None, **kw):
+    """
+    Execute a command, streaming its output line by line.
+    List commands exec directly; only string commands go through a shell.
+    capture_output buffered an hour of COLMAP/Brush logs in memory before
+    printing anything; streaming keeps memory O(1) and surfaces progress
+    in real time.
+
+    `timeout` (seconds) arms a watchdog that kills the process at the
+    deadline, so a hung native binary surfaces as a non-zero exit instead
+    of wedging its worker slot forever.
     """
     print("▶", " ".join(cmd) if isinstance(cmd, list) else cmd)
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True, **kw)
-    if result.stdout:
-        print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
-    return result.returncode
+    kw.setdefault("env", subprocess_env())
+    proc = subprocess.Popen(cmd, shell=isinstance(cmd, str),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, bufsize=1, **kw)
+    watchdog = None
+    if timeout is not None:
+        watchdog = threading.Timer(timeout, proc.kill)
+        watchdog.daemon = True
+        watchdog.start()
+    try:
+        for line in proc.stdout:
+            sys.stdout.write(line)
+        return proc.wait()
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
 
 def run_check(cmd, **kw):
     """
-    Execute a shell command with check=True (raises exception on failure).
+    Execute a command with check=True (raises exception on failure).
     """
     print("▶", " ".join(cmd) if isinstance(cmd, list) else cmd)
-    subprocess.run(cmd, check=True, **kw)
+    kw.setdefault("env", subprocess_env())
+    subprocess.run(cmd, shell=isinstance(cmd, str), check=True, **kw)
 
 def s3_download_dir(s3_pref: str, local_dir: str):
     """
     Downloads a s3 directory to a local directory.
+    Lists keys once, then downloads concurrently (boto3 multipart transfers).
     """
-    run_check(["aws", "s3", "cp", s3_pref, local_dir, "--recursive"])
+    bucket, prefix = _parse_s3_url(s3_pref)
+    print(f"▶ s3 download s3://{bucket}/{prefix} -> {local_dir}")
+
+    keys = []
+    paginator = _s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith("/"):  # skip folder placeholders
+                keys.append(obj["Key"])
+
+    def _download(key):
+        rel_path = key[len(prefix):].lstrip("/")
+        local_path = os.path.join(local_dir, rel_path)
+        os.makedirs(os.path.dirname(local_path) or local_dir, exist_ok=True)
+        _s3.download_file(bucket, key, local_path, Config=_PER_FILE_CONFIG)
+
+    with ThreadPoolExecutor(max_workers=_TRANSFER_CONFIG.max_concurrency) as pool:
+        list(pool.map(_download, keys))
+
+    print(f"Downloaded {len(keys)} objects from {s3_pref}")
 
 def s3_upload_dir(local_dir: str, s3_pref: str):
     """
     Uploads a local directory to a s3 directory.
+    Walks the tree once, then uploads concurrently (boto3 multipart transfers).
+    """
+    bucket, prefix = _parse_s3_url(s3_pref)
+    print(f"▶ s3 upload {local_dir} -> s3://{bucket}/{prefix}")
+
+    files = []
+    for root, _, names in os.walk(local_dir):
+        for name in names:
+            files.append(os.path.join(root, name))
+
+    def _upload(local_path):
+        rel_path = os.path.relpath(local_path, local_dir)
+        key = f"{prefix.rstrip('/')}/{rel_path}" if prefix else rel_path
+        _s3.upload_file(local_path, bucket, key, Config=_PER_FILE_CONFIG)
+
+    with ThreadPoolExecutor(max_workers=_TRANSFER_CONFIG.max_concurrency) as pool:
+        list(pool.map(_upload, files))
+
+    print(f"Uploaded {len(files)} files to {s3_pref}")
+
+def s3_upload_dir_filtered(local_dir: str, s3_pref: str, exclude: tuple = ()):
     """
-    run_check(["aws", "s3", "cp", local_dir, s3_pref, "--recursive"])
+    Uploads a local directory to s3, pruning excluded patterns before any
+    transfer work is queued (unlike the CLI's client-side --exclude which
+    still walks and filters every candidate).
+    """
+    import fnmatch
+
+    bucket, prefix = _parse_s3_url(s3_pref)
+    print(f"▶ s3 upload {local_dir} -> s3://{bucket}/{prefix} (exclude: {list(exclude)})")
+
+    files = []
+    for root, _, names in os.walk(local_dir):
+        for name in names:
+            if not any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+                files.append(os.path.join(root, name))
+
+    def _upload(local_path):
+        rel_path = os.path.relpath(local_path, local_dir)
+        key = f"{prefix.rstrip('/')}/{rel_path}" if prefix else rel_path
+        _s3.upload_file(local_path, bucket, key, Config=_PER_FILE_CONFIG)
+
+    with ThreadPoolExecutor(max_workers=_TRANSFER_CONFIG.max_concurrency) as pool:
+        list(pool.map(_upload, files))
+
+    print(f"Uploaded {len(files)} files to {s3_pref}")
+
+def s3_server_side_copy(src_bucket: str, src_key: str, dst_bucket: str, dst_key: str):
+    """
+    Copy an object inside S3 without downloading it.
+    boto3 issues UploadPartCopy under the hood, so bytes move on the S3
+    backplane instead of through the client NIC.
+    """
+    print(f"▶ s3 copy s3://{src_bucket}/{src_key} -> s3://{dst_bucket}/{dst_key}")
+    _s3.copy(
+        {"Bucket": src_bucket, "Key": src_key},
+        dst_bucket,
+        dst_key,
+        Config=_TRANSFER_CONFIG,
+    )
 
 def s3_download_file(s3_pref: str, local_path: str):
     """
     Downloads a single s3 file to a local path.
+    Uses the shared boto3 client - no aws-cli fork per call.
+    """
+    bucket, key = _parse_s3_url(s3_pref)
+    print(f"▶ s3 download s3://{bucket}/{key} -> {local_path}")
+    _s3.download_file(bucket, key, local_path, Config=_TRANSFER_CONFIG)
+
+def s3_download_if_changed(s3_pref: str, local_path: str) -> bool:
+    """
+    Downloads an s3 file only when its ETag differs from the one cached
+    in a <local_path>.etag sidecar. A head_object is one cheap metadata
+    round-trip, so unchanged files (e.g. repeated mask refines on the
+    same points JSON) skip the transfer entirely.
+    Returns True if a fresh copy was downloaded.
     """
-    run_check(["aws", "s3", "cp", s3_pref, local_path])
+    bucket, key = _parse_s3_url(s3_pref)
+    etag_path = local_path + ".etag"
+    remote_etag = _s3.head_object(Bucket=bucket, Key=key)["ETag"]
+
+    if os.path.exists(local_path) and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            if f.read() == remote_etag:
+                print(f"▶ s3 unchanged s3://{bucket}/{key} (etag match), reusing {local_path}")
+                return False
+
+    s3_download_file(s3_pref, local_path)
+    with open(etag_path, "w") as f:
+        f.write(remote_etag)
+    return True
 
 def s3_upload_file(local_path: str, s3_pref: str):
     """
     Uploads a single local file to s3.
+    Uses the shared boto3 client - no aws-cli fork per call.
     """
-    run_check(["aws", "s3", "cp", local_path, s3_pref])
+    bucket, key = _parse_s3_url(s3_pref)
+    if not key or key.endswith("/"):
+        key = key + os.path.basename(local_path)
+    print(f"▶ s3 upload {local_path} -> s3://{bucket}/{key}")
+    _s3.upload_file(local_path, bucket, key, Config=_TRANSFER_CONFIG)
+
+# Shared HTTP session for FastAPI calls - keep-alive amortizes the TLS
+# handshake across status updates, and transient 5xx/429s get retried.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504]),
+))
 
 def patch_status(fastapi_url: str, token: str, job_id: str, status: str):
     """
@@ -69,9 +260,10 @@ def patch_status(fastapi_url: str, token: str, job_id: str, status: str):
     if fastapi_url == "http://dummy" or fastapi_url == "dummy":
         print(f"[TEST MODE] Would update job {job_id} status to: {status}")
         return
-    
+
     headers = {'Authorization': f'Bearer {token}'}
-    resp = requests.patch(f"{fastapi_url}/jobs/{job_id}", json={"status": status}, headers=headers)
+    resp = _SESSION.patch(f"{fastapi_url}/jobs/{job_id}", json={"status": status},
+                          headers=headers, timeout=(3, 10))
     resp.raise_for_status()
     print(f"Updated job {job_id} status to: {status}")
 
@@ -81,43 +273,177 @@ def get_job_workspace(job_id: str) -> str:
     """
     return os.path.expanduser(f"~/torque/jobs/{job_id}")
 
+# Short-TTL existence cache: pipeline stages probe the same job dirs over
+# and over, so answer repeat exists() checks without a stat syscall
+_stat_cache = {}
+
+def _exists(path: str, ttl: float = 5.0) -> bool:
+    now = time.monotonic()
+    cached = _stat_cache.get(path)
+    if cached and now - cached[0] < ttl:
+        return cached[1]
+    value = os.path.exists(path)
+    _stat_cache[path] = (now, value)
+    return value
+
 def ensure_dir(path: str):
     """
     Create directory if it doesn't exist.
     """
     os.makedirs(path, exist_ok=True)
+    _stat_cache[path] = (time.monotonic(), True)
 
 def throwFNF(fpath: str, msg: str = ""):
     """
     Throw FileNotFoundError if file doesn't exist.
     Used in refine_mask.py.
     """
-    if not os.path.exists(fpath):
+    if not _exists(fpath):
         raise FileNotFoundError(f"{fpath} {msg}")
 
+# orjson parses at C speed; fall back to stdlib json when unavailable
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+@functools.lru_cache(maxsize=16)
+def _load_points_cached(points_json_path: str, _mtime_ns: int) -> dict:
+    with open(points_json_path, 'rb') as f:
+        return _json_loads(f.read())
+
 def load_points_json(points_json_path: str) -> tuple:
     """
     Load points and labels from initial_points.json.
-    Returns (points, labels) tuple.
+    Returns (points, labels) tuple. Parses are cached per (path, mtime)
+    since stages re-read the same prompt file.
     """
-    with open(points_json_path) as f:
-        data = json.load(f)
+    data = _load_points_cached(points_json_path, os.stat(points_json_path).st_mtime_ns)
     points = data.get('points', [])
     labels = data.get('labels', [1] * len(points))
     return points, labels
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.tif', '.tiff', '.bmp')
+
+@functools.lru_cache(maxsize=8)
+def _list_images(images_dir: str, exclude_video: bool, _dir_mtime_ns: int) -> tuple:
+    """
+    Scan a directory for image files in a single pass, memoized per
+    (dir, mtime) so repeated enumeration of an unchanged directory costs
+    no syscalls. The generator feeds sorted() directly - no intermediate
+    lists, and the video filter is applied inline.
+    """
+    with os.scandir(images_dir) as it:
+        return tuple(sorted(
+            e.name for e in it
+            if e.is_file(follow_symlinks=False)
+            and e.name.lower().endswith(IMAGE_EXTENSIONS)
+            and (not exclude_video or not e.name.endswith('_video.mp4'))
+        ))
+
 def get_image_files(images_dir: str, exclude_video: bool = True) -> list:
     """
     Get all image files from a directory, optionally excluding video files.
     Returns sorted list of filenames.
     """
-    extensions = ('.jpg', '.jpeg', '.png', '.heic', '.tif', '.tiff', '.bmp')
-    files = [f for f in os.listdir(images_dir) if f.lower().endswith(extensions)]
-    
-    if exclude_video:
-        files = [f for f in files if not f.endswith('_video.mp4')]
-    
-    return sorted(files)
+    return list(_list_images(images_dir, exclude_video, os.stat(images_dir).st_mtime_ns))
+
+# libjpeg-turbo decodes/encodes JPEG ~2x faster than OpenCV's reader
+# thanks to its SIMD IDCT; optional, falls back to cv2 when missing
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
+def _read_image_bgr(image_path: str):
+    """Decode an image to BGR, using libjpeg-turbo for JPEGs when available."""
+    if _turbo_jpeg and image_path.lower().endswith(('.jpg', '.jpeg')):
+        try:
+            with open(image_path, 'rb') as f:
+                return _turbo_jpeg.decode(f.read(), pixel_format=TJPF_BGR)
+        except Exception:
+            pass  # corrupt header or unsupported variant - let cv2 try
+    return cv2.imread(image_path)
+
+def _write_image_bgr(image_path: str, image) -> None:
+    """Encode a BGR image, using libjpeg-turbo for JPEGs when available."""
+    if _turbo_jpeg and image_path.lower().endswith(('.jpg', '.jpeg')):
+        try:
+            with open(image_path, 'wb') as f:
+                f.write(_turbo_jpeg.encode(image, quality=90, pixel_format=TJPF_BGR))
+            return
+        except Exception:
+            pass
+    cv2.imwrite(image_path, image)
+
+def _resize_one(image_path: str, max_dimension: int) -> bool:
+    """
+    Resize a single image in-place if it exceeds max_dimension.
+    Returns True if the image was resized.
+    """
+    # OpenCV parallelism stays off inside workers - the outer pool owns the cores
+    cv2.setNumThreads(1)
+
+    image_file = os.path.basename(image_path)
+    image = _read_image_bgr(image_path)
+    if image is None:
+        print(f"Warning: Could not load {image_file}, skipping")
+        return False
+
+    height, width = image.shape[:2]
+
+    # Check if resize needed
+    if max(height, width) > max_dimension:
+        # Calculate new dimensions while preserving aspect ratio
+        if width > height:
+            new_width = max_dimension
+            new_height = int(height * (max_dimension / width))
+        else:
+            new_height = max_dimension
+            new_width = int(width * (max_dimension / height))
+
+        # Halve with pyrDown while we're still >=2x over target - its fixed
+        # 5x5 Gaussian kernel is much faster than INTER_AREA at large ratios
+        scale = max_dimension / max(height, width)
+        resized_image = image
+        while scale <= 0.5:
+            resized_image = cv2.pyrDown(resized_image)
+            scale *= 2
+
+        # Finish the fractional remainder with INTER_AREA
+        resized_image = cv2.resize(resized_image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+        # Save resized image (overwrite original)
+        _write_image_bgr(image_path, resized_image)
+
+        print(f"Resized {image_file}: {width}x{height} → {new_width}x{new_height}")
+        return True
+    else:
+        print(f"Kept {image_file}: {width}x{height} (already within {max_dimension}px)")
+        return False
+
+def resize_images_to_max_dimension(images_dir: str, max_dimension: int = 1024):
+    """
+    Resize all images in directory to max dimension while preserving aspect ratio.
+    Processes images in-place to optimize storage and subsequent pipeline stages.
+    Images are independent, so the decode/resize/encode work runs on a thread
+    pool (OpenCV releases the GIL in imread/resize/imwrite).
+    """
+    image_files = get_image_files(images_dir)
+    image_paths = [os.path.join(images_dir, f) for f in image_files]
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = list(pool.map(
+            functools.partial(_resize_one, max_dimension=max_dimension),
+            image_paths
+        ))
+
+    resized_count = sum(results)
+    print(f"Resized {resized_count}/{len(image_files)} images to max {max_dimension}px")
+    return resized_count
 
 def validate_job_dirs(job_id: str, required_dirs: list) -> str:
     """
@@ -128,7 +454,7 @@ def validate_job_dirs(job_id: str, required_dirs: list) -> str:
     
     for dir_name in required_dirs:
         dir_path = os.path.join(workspace, dir_name)
-        if not os.path.exists(dir_path):
+        if not _exists(dir_path):
             raise FileNotFoundError(f"Required directory not found: {dir_path}")
     
     return workspace
@@ -136,24 +462,72 @@ def validate_job_dirs(job_id: str, required_dirs: list) -> str:
 class JobPaths:
     """
     Helper class to manage standard job directory paths.
+    Derived paths are built lazily and cached per instance, so constructing
+    a JobPaths repeatedly costs nothing beyond storing the job_id.
     """
     def __init__(self, job_id: str):
         self.job_id = job_id
-        self.workspace = get_job_workspace(job_id)
-        self.images = os.path.join(self.workspace, "images")
-        self.preview = os.path.join(self.workspace, "preview")
-        self.config = os.path.join(self.workspace, "config")
-        self.masks = os.path.join(self.workspace, "masks")
-        self.rgba = os.path.join(self.workspace, "rgba")
-        self.colmap = os.path.join(self.workspace, "colmap")
-        
-        # Common files
-        self.video = os.path.join(self.images, f"{job_id}_video.mp4")
-        self.first_frame = os.path.join(self.preview, "first_frame.png")
-        self.points_json = os.path.join(self.config, "initial_points.json")
-        self.video_masks = os.path.join(self.masks, "video_masks.npz")
-        self.img_masks = os.path.join(self.preview, "img_masks.npz")
-    
+
+    @functools.cached_property
+    def workspace(self):
+        return get_job_workspace(self.job_id)
+
+    @functools.cached_property
+    def images(self):
+        return os.path.join(self.workspace, "images")
+
+    @functools.cached_property
+    def preview(self):
+        return os.path.join(self.workspace, "preview")
+
+    @functools.cached_property
+    def config(self):
+        return os.path.join(self.workspace, "config")
+
+    @functools.cached_property
+    def masks(self):
+        return os.path.join(self.workspace, "masks")
+
+    @functools.cached_property
+    def rgba(self):
+        return os.path.join(self.workspace, "rgba")
+
+    @functools.cached_property
+    def colmap(self):
+        return os.path.join(self.workspace, "colmap")
+
+    # Common files
+
+    @functools.cached_property
+    def video(self):
+        return os.path.join(self.images, f"{self.job_id}_video.mp4")
+
+    @functools.cached_property
+    def first_frame(self):
+        return os.path.join(self.preview, "first_frame.png")
+
+    @functools.cached_property
+    def first_frame_small(self):
+        # pre-resized to SAM2's 1024px input - refine clicks skip the
+        # full-resolution decode + downscale
+        return os.path.join(self.preview, "first_frame_1024.png")
+
+    @functools.cached_property
+    def points_json(self):
+        return os.path.join(self.config, "initial_points.json")
+
+    @functools.cached_property
+    def video_masks(self):
+        return os.path.join(self.masks, "video_masks.npz")
+
+    @functools.cached_property
+    def img_masks(self):
+        return os.path.join(self.preview, "img_masks.npz")
+
+    @functools.cached_property
+    def embeddings(self):
+        return os.path.join(self.preview, "first_frame_embeddings.pt")
+
     def ensure_dirs(self, *dir_names):
         """
         Ensure specified directories exist.
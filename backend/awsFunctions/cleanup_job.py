@@ -4,35 +4,53 @@ if 3D model uploaded to S3, delete entire job directory.
 """
 import argparse
 import os
-import shutil
 import subprocess
+import boto3
+from botocore.exceptions import ClientError
 from aws_utils import JobPaths
 
+s3 = boto3.client("s3")
+
 
 def check_s3_model_exists(bucket: str, job_id: str) -> bool:
     """Check if 3D model exists in S3."""
-    s3_path = f"s3://{bucket}/{job_id}/gaussian_splat/"
+    # Model filenames vary (export_<iter>.ply), so list the prefix once
+    # instead of shelling out to `aws s3 ls` per job.
     try:
-        result = subprocess.run(
-            ["aws", "s3", "ls", s3_path], 
-            capture_output=True, text=True, check=False
+        response = s3.list_objects_v2(
+            Bucket=bucket, Prefix=f"{job_id}/gaussian_splat/"
         )
-        return result.returncode == 0 and ".ply" in result.stdout
-    except Exception:
+        return any(obj["Key"].endswith(".ply") for obj in response.get("Contents", []))
+    except ClientError:
         return False
 
 
-def cleanup_completed_job(job_id: str, bucket: str) -> bool:
+def list_s3_model_job_ids(bucket: str) -> set:
+    """List all job_ids that have a 3D model in S3 (single paginated scan)."""
+    paginator = s3.get_paginator("list_objects_v2")
+    return {
+        obj["Key"].split("/")[0]
+        for page in paginator.paginate(Bucket=bucket)
+        for obj in page.get("Contents", [])
+        if obj["Key"].endswith(".ply") and "/gaussian_splat/" in obj["Key"]
+    }
+
+
+def cleanup_completed_job(job_id: str, bucket: str, existing: set = None) -> bool:
     """Remove job directory if model uploaded to S3."""
     paths = JobPaths(job_id)
-    
+
     if not os.path.exists(paths.workspace):
         print(f"Job directory doesn't exist: {job_id}")
         return False
-    
-    if check_s3_model_exists(bucket, job_id):
+
+    model_exists = job_id in existing if existing is not None \
+        else check_s3_model_exists(bucket, job_id)
+    if model_exists:
         try:
-            shutil.rmtree(paths.workspace)
+            # rm -rf unlinks via libc and is considerably faster than a
+            # Python-level rmtree on workspaces with thousands of frames
+            subprocess.run(["rm", "-rf", paths.workspace], check=True)
             print(f"Cleaned up job {job_id} (model safe in S3)")
             return True
         except Exception as e:
@@ -43,6 +61,15 @@ def cleanup_completed_job(job_id: str, bucket: str) -> bool:
         return False
 
 
+def run_step(job_id: str, bucket: str) -> bool:
+    """In-process entrypoint for the worker daemon - no interpreter fork."""
+    try:
+        return cleanup_completed_job(job_id, bucket)
+    except Exception as e:
+        print(f"cleanup failed for {job_id}: {e}")
+        return False
+
+
 def main():
     parser = argparse.ArgumentParser(description="Clean up completed jobs")
     parser.add_argument("--job_id", help="Specific job to clean")
@@ -56,9 +83,13 @@ def main():
     elif args.all:
         jobs_dir = os.path.expanduser("~/torque/jobs")
         if os.path.exists(jobs_dir):
-            for job_id in os.listdir(jobs_dir):
-                if os.path.isdir(os.path.join(jobs_dir, job_id)):
-                    cleanup_completed_job(job_id, args.bucket)
+            # One S3 LIST covers every job instead of a probe per directory
+            existing = list_s3_model_job_ids(args.bucket)
+            # scandir's DirEntry knows the entry type, so no stat per job dir
+            with os.scandir(jobs_dir) as it:
+                job_ids = [e.name for e in it if e.is_dir(follow_symlinks=False)]
+            for job_id in job_ids:
+                cleanup_completed_job(job_id, args.bucket, existing=existing)
     else:
         parser.error("Use --job_id or --all")
 
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+performance_analysis.py
+
+Profiles the batch RGBA compositing path (the workload torque_cpp optimizes)
+on synthetic data shaped like real jobs (12 images @ 2142x2856). Produces the
+operation breakdown, threading-scaling numbers, and the C++/OpenMP speedup
+estimate quoted in the README.
+
+Run: python3 performance_analysis.py
+Writes performance_analysis.json next to the script.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+try:
+    import torque_cpp
+except ImportError:
+    torque_cpp = None
+
+try:
+    import cupy
+except ImportError:
+    cupy = None
+
+DEFAULT_NUM_IMAGES = 12
+DEFAULT_HEIGHT = 2142
+DEFAULT_WIDTH = 2856
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, boundscheck=False, nogil=True)
+    def fuse_bgr_mask_to_rgba(bgr, mask, out, tile):
+        """
+        One fused pass: read BGR + mask once, write RGBA once. The baseline
+        does three trips over ~17 MB per frame (cvtColor, mask cast, dstack);
+        this is memory-bound, so fusing cuts DRAM traffic ~3x. nogil also
+        lets the thread-scaling test actually scale.
+
+        The y loop is blocked into `tile`-row strips sized to fit a strip's
+        BGR+mask+RGBA working set (8 B/pixel) in L2, so full-image passes
+        don't round-trip DRAM between read and write.
+        """
+        height, width = mask.shape
+        n_strips = (height + tile - 1) // tile
+        for s in prange(n_strips):
+            y0 = s * tile
+            y1 = min(y0 + tile, height)
+            for y in range(y0, y1):
+                for x in range(width):
+                    out[y, x, 0] = bgr[y, x, 2]
+                    out[y, x, 1] = bgr[y, x, 1]
+                    out[y, x, 2] = bgr[y, x, 0]
+                    out[y, x, 3] = 255 if mask[y, x] else 0
+else:
+    fuse_bgr_mask_to_rgba = None
+
+
+class PlanarBatch(NamedTuple):
+    """SoA layout: one (N,H,W) plane per channel instead of interleaved AoS."""
+    R: np.ndarray
+    G: np.ndarray
+    B: np.ndarray
+    A: np.ndarray
+
+
+class PerformanceProfiler:
+    """Measures the RGBA batch pipeline and estimates optimization headroom."""
+
+    # memoized across instances - probing forks sysctl on macOS and the
+    # answer never changes within a process
+    _SYSTEM_INFO = None
+
+    def __init__(self):
+        self.system_info = self._get_system_info()
+        self.results = {}
+        # shape-specialized fused kernels, keyed by (H, W)
+        self._specialized_kernels = {}
+
+    @classmethod
+    def _get_system_info(cls):
+        """Collect CPU/cache/memory info used to contextualize the numbers."""
+        if cls._SYSTEM_INFO is not None:
+            return cls._SYSTEM_INFO
+
+        info = {
+            'platform': platform.system(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            # fallbacks if the platform probes below don't fill these in
+            'l1_cache_kb': 32,
+            'l2_cache_kb': 256,
+            'l3_cache_kb': 8192,
+        }
+
+        if platform.system() == 'Linux':
+            # EC2 path: sysfs publishes per-level sizes as e.g. "1024K"/"32M";
+            # index0=L1d, index2=L2, index3=L3. Missing in some containers.
+            def read_cache_kb(index):
+                try:
+                    with open(f'/sys/devices/system/cpu/cpu0/cache/index{index}/size') as f:
+                        size = f.read().strip()
+                except OSError:
+                    return None
+                if size.endswith('K'):
+                    return int(size[:-1])
+                if size.endswith('M'):
+                    return int(size[:-1]) * 1024
+                return int(size) // 1024 if size.isdigit() else None
+
+            for index, info_key in ((0, 'l1_cache_kb'), (2, 'l2_cache_kb'),
+                                    (3, 'l3_cache_kb')):
+                size_kb = read_cache_kb(index)
+                if size_kb:
+                    info[info_key] = size_kb
+
+        if platform.system() == 'Darwin':
+            try:
+                # one sysctl fork for all four queries, parsed as key: value
+                out = subprocess.run(
+                    ['sysctl', 'machdep.cpu.brand_string', 'hw.l1dcachesize',
+                     'hw.l2cachesize', 'hw.l3cachesize'],
+                    capture_output=True, text=True).stdout
+                values = dict(line.split(':', 1) for line in out.splitlines()
+                              if ':' in line)
+                values = {k.strip(): v.strip() for k, v in values.items()}
+                if 'machdep.cpu.brand_string' in values:
+                    info['cpu_brand'] = values['machdep.cpu.brand_string']
+                for sysctl_key, info_key in (('hw.l1dcachesize', 'l1_cache_kb'),
+                                             ('hw.l2cachesize', 'l2_cache_kb'),
+                                             ('hw.l3cachesize', 'l3_cache_kb')):
+                    if values.get(sysctl_key, '').isdigit():
+                        info[info_key] = int(values[sysctl_key]) // 1024
+            except Exception:
+                pass
+
+        if psutil is not None:
+            vm = psutil.virtual_memory()
+            info['total_memory_gb'] = vm.total / (1024 ** 3)
+            info['available_memory_gb'] = vm.available / (1024 ** 3)
+
+        cls._SYSTEM_INFO = info
+        return info
+
+    def create_test_data(self, num_images=DEFAULT_NUM_IMAGES,
+                         height=DEFAULT_HEIGHT, width=DEFAULT_WIDTH):
+        """Generate synthetic BGR images + binary masks matching job shapes."""
+        print(f"creating test data: {num_images} images @ {height}x{width}")
+
+        # structure overlay computed once; cv2.add saturates, replacing the
+        # per-image int16 upcast + np.clip round trip
+        overlay = np.tile((np.sin(np.arange(width) * 0.01) * 50).astype(np.int16),
+                          (height, 1))
+
+        images = []
+        for i in range(num_images):
+            img = np.empty((height, width, 3), np.uint8)
+            cv2.randu(img, 0, 256)  # fast PRNG, fills in place
+            img[:, :, 0] = cv2.add(img[:, :, 0], overlay, dtype=cv2.CV_8U)
+            images.append(img)
+
+        # circular object mask, like a centered scan subject - the ogrid
+        # math is identical for every frame, so compute it once
+        y, x = np.ogrid[:height, :width]
+        cy, cx = height // 2, width // 2
+        r = min(height, width) // 3
+        mask_circle = (((x - cx) ** 2 + (y - cy) ** 2) < r * r).astype(np.uint8)
+        # the ~70 MB random fill was overwritten immediately; just repeat the
+        # circle (np.repeat keeps the array writable for in-place variants)
+        masks = np.repeat(mask_circle[None], num_images, axis=0)
+
+        return images, masks
+
+    def time_operation(self, func, *args, **kwargs):
+        """Time one invocation; returns (result, elapsed_seconds)."""
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        return result, elapsed
+
+    def time_operation_stable(self, func, *args, min_time=0.1, **kwargs):
+        """
+        Timeit-style repetition: one rough run picks N so total elapsed
+        reaches min_time, then N calls share a single perf_counter bracket.
+        Sub-millisecond ops measured one-shot are dominated by timer
+        resolution and OS jitter, which would skew the Amdahl fractions.
+        Returns (result, mean_elapsed_seconds).
+        """
+        result, first = self.time_operation(func, *args, **kwargs)
+        if first >= min_time:
+            return result, first
+
+        repeats = max(1, int(min_time / first) if first > 0 else 100)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        return result, elapsed / repeats
+
+    # RGBA implementations under test
+
+    def create_rgba_single(self, image, mask):
+        """Current production path: cvtColor + mask cast + dstack (3 passes)."""
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # one vectorized pass to 0/255, vs compare + cast + multiply (3 passes)
+        alpha_channel = cv2.compare(mask, 0, cv2.CMP_GT)
+        # cv2.merge uses SIMD interleave stores; np.dstack routes through
+        # the general concatenate path
+        return cv2.merge([image_rgb[:, :, 0], image_rgb[:, :, 1],
+                          image_rgb[:, :, 2], alpha_channel])
+
+    def _fusion_tile_rows(self, width):
+        """Rows per strip so BGR+mask+RGBA (8 B/pixel) stays within L2."""
+        l2_bytes = self.system_info['l2_cache_kb'] * 1024
+        return max(1, l2_bytes // (width * 8))
+
+    def _get_specialized_kernel(self, height, width):
+        """
+        Compile a fused kernel with H, W, and the L2 tile closed over as
+        constants. Numba freezes closure variables at compile time, so the
+        index math strength-reduces and the inner loop has a known trip
+        count - compile once per shape, reuse for every batch.
+        """
+        if njit is None:
+            return None
+        key = (height, width)
+        kernel = self._specialized_kernels.get(key)
+        if kernel is None:
+            tile = self._fusion_tile_rows(width)
+            n_strips = (height + tile - 1) // tile
+
+            @njit(parallel=True, fastmath=True, boundscheck=False, nogil=True)
+            def kernel(bgr, mask, out):
+                for s in prange(n_strips):
+                    y0 = s * tile
+                    y1 = min(y0 + tile, height)
+                    for y in range(y0, y1):
+                        for x in range(width):
+                            out[y, x, 0] = bgr[y, x, 2]
+                            out[y, x, 1] = bgr[y, x, 1]
+                            out[y, x, 2] = bgr[y, x, 0]
+                            out[y, x, 3] = 255 if mask[y, x] else 0
+
+            self._specialized_kernels[key] = kernel
+        return kernel
+
+    def create_rgba_simd(self, image, mask):
+        """AVX2 shuffle kernel from the C++ extension (one fused pass)."""
+        return torque_cpp.bgr_mask_to_rgba(image, mask)
+
+    def create_rgba_mixchannels(self, image, mask):
+        """
+        Two-pass variant with no custom code: compare for alpha, then one
+        cv2.mixChannels call mapping BGR[0,1,2]+alpha straight into RGBA -
+        collapses the cvtColor and interleave into a single SIMD remap.
+        """
+        alpha = cv2.compare(mask, 0, cv2.CMP_GT)
+        rgba = np.empty((*image.shape[:2], 4), np.uint8)
+        cv2.mixChannels([image, alpha], [rgba], [0, 2, 1, 1, 2, 0, 3, 3])
+        return rgba
+
+    def _create_rgba_batch(self, images, masks, out=None):
+        """
+        Pre-allocated batch variant: one (N,H,W,4) output buffer, channels
+        written in place. Avoids the per-image dstack copy (a full extra
+        pass over ~17 MB per frame) and the allocator churn of N temporaries.
+        """
+        n = len(images)
+        height, width = images[0].shape[:2]
+        if out is None:
+            out = np.empty((n, height, width, 4), np.uint8)
+
+        for i in range(n):
+            # a strided 3-channel slice of a 4-channel buffer is a layout
+            # cv::Mat can't express, so cvtColor(dst=...) would throw;
+            # mixChannels remaps BGR+alpha into the full interleaved slice
+            alpha = cv2.compare(masks[i], 0, cv2.CMP_GT)
+            cv2.mixChannels([images[i], alpha], [out[i]], [0, 2, 1, 1, 2, 0, 3, 3])
+
+        return out
+
+    def to_planar(self, images, masks):
+        """Split interleaved BGR + mask into a PlanarBatch (one-time cost)."""
+        n = len(images)
+        height, width = images[0].shape[:2]
+        planes = PlanarBatch(*[np.empty((n, height, width), np.uint8) for _ in range(4)])
+        for i in range(n):
+            b, g, r = cv2.split(images[i])
+            planes.R[i] = r
+            planes.G[i] = g
+            planes.B[i] = b
+            planes.A[i] = cv2.compare(masks[i], 0, cv2.CMP_GT)
+        return planes
+
+    def _create_rgba_batch_planar(self, planar, out=None):
+        """
+        SoA variant: channels stay planar through any per-pixel stages and
+        interleave exactly once at the end via cv2.merge's SIMD interleave,
+        instead of shuffling AoS pixels on every load.
+        """
+        n, height, width = planar.R.shape
+        if out is None:
+            out = np.empty((n, height, width, 4), np.uint8)
+        for i in range(n):
+            cv2.merge((planar.R[i], planar.G[i], planar.B[i], planar.A[i]),
+                      dst=out[i])
+        return out
+
+    def process_batch_vectorized(self, images_arr, masks):
+        """
+        Whole-batch 4-D pass: one numpy call per stage over (N,H,W,...)
+        instead of 12 per-image Python round-trips. The ::-1 channel
+        reversal is a SIMD stride copy; the alpha writes straight into the
+        output plane.
+        """
+        n, height, width = masks.shape
+        rgba = np.empty((n, height, width, 4), np.uint8)
+        rgba[..., :3] = images_arr[..., ::-1]
+        np.greater(masks, 0, out=rgba[..., 3])
+        rgba[..., 3] *= 255
+        return rgba
+
+    def process_batch_sequential(self, images, masks):
+        """Baseline loop mirroring batch_create_rgba_masks."""
+        # fixed-length list up front - no capacity doublings mid-loop
+        rgba_images = [None] * len(images)
+        for i in range(len(images)):
+            rgba_images[i] = self.create_rgba_single(images[i], masks[i])
+        return rgba_images
+
+    def process_batch_threaded(self, images, masks, num_threads):
+        """ThreadPoolExecutor variant of the baseline loop."""
+        rgba_images = [None] * len(images)
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = [executor.submit(self.create_rgba_single, images[i], masks[i])
+                       for i in range(len(images))]
+            for i, future in enumerate(futures):
+                rgba_images[i] = future.result()
+        return rgba_images
+
+    def create_rgba_cuda(self, images_gpu, masks_gpu):
+        """
+        GPU batch assembly on CuPy arrays already resident on the device.
+        The T4 on g4dn has ~13x the memory bandwidth of the host, and when
+        the masks come straight from SAM2 (already on GPU) this skips the
+        D2H/H2D round trip the CPU path implies.
+        """
+        n, height, width = masks_gpu.shape
+        rgba = cupy.empty((n, height, width, 4), cupy.uint8)
+        rgba[..., :3] = images_gpu[..., ::-1]
+        rgba[..., 3] = (masks_gpu > 0).astype(cupy.uint8) * 255
+        return rgba
+
+    def profile_cuda_implementation(self, images, masks):
+        """Time the GPU path, separating transfer cost from kernel cost."""
+        images_arr = np.stack(images)
+
+        _, h2d_s = self.time_operation(
+            lambda: (cupy.asarray(images_arr), cupy.asarray(masks)))
+        images_gpu, masks_gpu = cupy.asarray(images_arr), cupy.asarray(masks)
+
+        def run_kernel():
+            out = self.create_rgba_cuda(images_gpu, masks_gpu)
+            cupy.cuda.Stream.null.synchronize()
+            return out
+
+        run_kernel()  # warm-up (kernel compilation / memory pool)
+        _, kernel_s = self.time_operation(run_kernel)
+
+        results = {'h2d_s': h2d_s, 'kernel_s': kernel_s}
+        print(f"  cuda kernel: {kernel_s * 1000:.1f}ms (+{h2d_s * 1000:.1f}ms h2d)")
+        self.results['cuda'] = results
+        return results
+
+    # Profiling stages
+
+    def _analyze_operation_breakdown(self, image, mask):
+        """Time each sub-operation of create_rgba_single for Amdahl analysis."""
+        breakdown = {}
+
+        _, breakdown['cvt_color_s'] = self.time_operation_stable(
+            cv2.cvtColor, image, cv2.COLOR_BGR2RGB)
+
+        _, breakdown['mask_to_alpha_s'] = self.time_operation_stable(
+            cv2.compare, mask, 0, cv2.CMP_GT)
+
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        alpha = cv2.compare(mask, 0, cv2.CMP_GT)
+        _, breakdown['dstack_s'] = self.time_operation_stable(
+            np.dstack, (image_rgb, alpha))
+        _, breakdown['merge_s'] = self.time_operation_stable(
+            cv2.merge, [image_rgb[:, :, 0], image_rgb[:, :, 1],
+                        image_rgb[:, :, 2], alpha])
+
+        # total reflects the production path; merge_s is the alternative
+        breakdown['total_s'] = (breakdown['cvt_color_s']
+                                + breakdown['mask_to_alpha_s']
+                                + breakdown['dstack_s'])
+        return breakdown
+
+    def profile_current_implementation(self):
+        """Profile sequential baseline vs the pre-allocated batch variant."""
+        print("\nprofiling current implementation...")
+        images, masks = self.create_test_data()
+
+        _, sequential_s = self.time_operation(self.process_batch_sequential, images, masks)
+        _, batch_s = self.time_operation(self._create_rgba_batch, images, masks)
+
+        mpix = len(images) * images[0].shape[0] * images[0].shape[1] / 1e6
+        results = {
+            'num_images': len(images),
+            'sequential_s': sequential_s,
+            'batch_preallocated_s': batch_s,
+            'batch_speedup': sequential_s / batch_s if batch_s else 0,
+            'sequential_mpix_per_s': mpix / sequential_s,
+            'batch_mpix_per_s': mpix / batch_s,
+            'operation_breakdown': self._analyze_operation_breakdown(images[0], masks[0]),
+        }
+
+        # compare + mixChannels: 2 passes over pixel data vs the baseline's 3
+        _, mix_s = self.time_operation(
+            lambda: [self.create_rgba_mixchannels(images[i], masks[i])
+                     for i in range(len(images))])
+        results['mixchannels_s'] = mix_s
+        results['mixchannels_speedup'] = sequential_s / mix_s if mix_s else 0
+        print(f"  mixchannels: {mix_s * 1000:.1f}ms ({results['mixchannels_speedup']:.2f}x)")
+
+        # whole-batch 4-D numpy pass (no per-image Python dispatch)
+        images_arr = np.stack(images)
+        _, vectorized_s = self.time_operation(
+            self.process_batch_vectorized, images_arr, masks)
+        results['batch_vectorized_s'] = vectorized_s
+        results['vectorized_speedup'] = sequential_s / vectorized_s if vectorized_s else 0
+        print(f"  4-d vectorized: {vectorized_s * 1000:.1f}ms ({results['vectorized_speedup']:.2f}x)")
+
+        # planar (SoA) variant: split cost excluded - measures what the
+        # pipeline would pay if frames were kept planar after decode
+        planar = self.to_planar(images, masks)
+        _, planar_s = self.time_operation(self._create_rgba_batch_planar, planar)
+        results['batch_planar_s'] = planar_s
+        results['planar_speedup'] = sequential_s / planar_s if planar_s else 0
+        print(f"  planar merge: {planar_s * 1000:.1f}ms ({results['planar_speedup']:.2f}x)")
+
+        if torque_cpp is not None and hasattr(torque_cpp, 'bgr_mask_to_rgba'):
+            _, simd_s = self.time_operation(
+                lambda: [self.create_rgba_simd(images[i], masks[i])
+                         for i in range(len(images))])
+            results['simd_s'] = simd_s
+            results['simd_speedup'] = sequential_s / simd_s if simd_s else 0
+            print(f"  avx2 shuffle kernel: {simd_s * 1000:.1f}ms ({results['simd_speedup']:.2f}x)")
+
+        if fuse_bgr_mask_to_rgba is not None:
+            out = np.empty((len(images), *images[0].shape[:2], 4), np.uint8)
+            tile = self._fusion_tile_rows(images[0].shape[1])
+            # warm-up run so JIT compilation doesn't land in the measurement
+            fuse_bgr_mask_to_rgba(images[0], masks[0], out[0], tile)
+            _, fused_s = self.time_operation(
+                lambda: [fuse_bgr_mask_to_rgba(images[i], masks[i], out[i], tile)
+                         for i in range(len(images))])
+            results['numba_fused_s'] = fused_s
+            results['numba_fused_speedup'] = sequential_s / fused_s if fused_s else 0
+            print(f"  numba fused: {fused_s * 1000:.1f}ms ({results['numba_fused_speedup']:.2f}x)")
+
+            # shape-specialized compile (H/W/tile as constants)
+            height, width = images[0].shape[:2]
+            specialized = self._get_specialized_kernel(height, width)
+            specialized(images[0], masks[0], out[0])  # warm-up compile
+            _, spec_s = self.time_operation(
+                lambda: [specialized(images[i], masks[i], out[i])
+                         for i in range(len(images))])
+            results['numba_specialized_s'] = spec_s
+            results['numba_specialized_speedup'] = sequential_s / spec_s if spec_s else 0
+            print(f"  numba specialized: {spec_s * 1000:.1f}ms "
+                  f"({results['numba_specialized_speedup']:.2f}x)")
+
+        print(f"  sequential: {sequential_s * 1000:.1f}ms ({results['sequential_mpix_per_s']:.1f} mpix/s)")
+        print(f"  batch (pre-allocated): {batch_s * 1000:.1f}ms ({results['batch_mpix_per_s']:.1f} mpix/s)")
+        self.results['current_implementation'] = results
+        return results
+
+    def profile_threading_potential(self):
+        """Measure thread scaling of the per-image RGBA work.
+
+        Scales over the nogil fused kernel when numba is available - the
+        numpy baseline re-acquires the GIL in the mask cast and dstack, so
+        a ThreadPoolExecutor over it measures lock contention, not cores.
+        """
+        print("\nprofiling threading potential...")
+        images, masks = self.create_test_data()
+
+        # pin to the first N cores so the scheduler can't migrate threads
+        # onto shared SMT siblings mid-measurement (skews the scaling curve)
+        saved_affinity = None
+        if hasattr(os, 'sched_getaffinity'):
+            saved_affinity = os.sched_getaffinity(0)
+        elif psutil is not None:
+            saved_affinity = psutil.Process().cpu_affinity()
+
+        def pin_cores(num_threads):
+            cores = set(range(num_threads))
+            try:
+                if hasattr(os, 'sched_setaffinity'):
+                    os.sched_setaffinity(0, cores)
+                elif psutil is not None:
+                    psutil.Process().cpu_affinity(sorted(cores))
+            except (OSError, ValueError):
+                pass  # containers may expose fewer cores than advertised
+
+        if fuse_bgr_mask_to_rgba is not None:
+            out = np.empty((len(images), *images[0].shape[:2], 4), np.uint8)
+            tile = self._fusion_tile_rows(images[0].shape[1])
+            fuse_bgr_mask_to_rgba(images[0], masks[0], out[0], tile)  # warm-up compile
+            worker = lambda i: fuse_bgr_mask_to_rgba(images[i], masks[i], out[i], tile)
+            scaling = {'kernel': 'numba_nogil'}
+        else:
+            worker = lambda i: self.create_rgba_single(images[i], masks[i])
+            scaling = {'kernel': 'python_baseline'}
+
+        def run_with(num_threads):
+            pin_cores(num_threads)
+            # the executor owns the cores; keep OpenCV's pool out of the way
+            with ThreadPoolExecutor(max_workers=num_threads,
+                                    initializer=cv2.setNumThreads,
+                                    initargs=(1,)) as executor:
+                for f in [executor.submit(worker, i) for i in range(len(images))]:
+                    f.result()
+
+        _, baseline_s = self.time_operation(run_with, 1)
+        scaling['threads_1'] = baseline_s
+        for num_threads in (2, 4):
+            _, elapsed = self.time_operation(run_with, num_threads)
+            scaling[f'threads_{num_threads}'] = elapsed
+            print(f"  {num_threads} threads: {elapsed * 1000:.1f}ms "
+                  f"({baseline_s / elapsed:.2f}x)")
+
+        if saved_affinity is not None:
+            try:
+                if hasattr(os, 'sched_setaffinity'):
+                    os.sched_setaffinity(0, saved_affinity)
+                elif psutil is not None:
+                    psutil.Process().cpu_affinity(sorted(saved_affinity))
+            except (OSError, ValueError):
+                pass
+
+        # OpenCV-internal variant: rows split across cores inside cvtColor,
+        # no Python future per image (12 submits @ ~60ms tasks isn't free)
+        saved_threads = cv2.getNumThreads()
+        try:
+            for num_threads in (2, 4):
+                cv2.setNumThreads(num_threads)
+                _, elapsed = self.time_operation(
+                    self.process_batch_sequential, images, masks)
+                scaling[f'cv2_internal_{num_threads}'] = elapsed
+                print(f"  cv2 internal x{num_threads}: {elapsed * 1000:.1f}ms "
+                      f"({baseline_s / elapsed:.2f}x)")
+        finally:
+            cv2.setNumThreads(saved_threads)
+
+        if fuse_bgr_mask_to_rgba is not None:
+            # numba prange: one parallel region per image, no thread handoffs
+            _, elapsed = self.time_operation(
+                lambda: [worker(i) for i in range(len(images))])
+            scaling['numba_prange'] = elapsed
+            print(f"  numba prange: {elapsed * 1000:.1f}ms "
+                  f"({baseline_s / elapsed:.2f}x)")
+
+        self.results['threading'] = scaling
+        return scaling
+
+    def estimate_cpp_openmp_speedup(self):
+        """Amdahl-style estimate for the C++/OpenMP kernel from the breakdown."""
+        breakdown = self.results.get('current_implementation', {}).get('operation_breakdown')
+        if not breakdown:
+            return None
+
+        total = breakdown['total_s']
+        # the pixel ops parallelize; assume residual Python dispatch is serial
+        parallel_fraction = (breakdown['cvt_color_s'] + breakdown['mask_to_alpha_s']
+                             + breakdown['dstack_s']) / total
+        cores = self.system_info['cpu_count'] or 1
+        estimate = 1.0 / ((1 - parallel_fraction) + parallel_fraction / cores)
+
+        analysis = {
+            'parallel_fraction': parallel_fraction,
+            'cores': cores,
+            'estimated_speedup': estimate,
+        }
+        print(f"\nestimated c++/openmp speedup: {estimate:.1f}x on {cores} cores")
+        self.results['cpp_speedup_analysis'] = analysis
+        return analysis
+
+    def run_full_analysis(self):
+        """Run every profiling stage and return the accumulated results."""
+        print("torque rgba performance analysis")
+        print(f"system: {self.system_info}")
+
+        self.profile_current_implementation()
+        self.profile_threading_potential()
+        if cupy is not None:
+            images, masks = self.create_test_data()
+            self.profile_cuda_implementation(images, masks)
+        self.estimate_cpp_openmp_speedup()
+
+        self.results['system_info'] = self.system_info
+        return self.results
+
+
+def _json_default(obj):
+    """Convert numpy leaves during json.dump - no recursive dict rebuild."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def main():
+    profiler = PerformanceProfiler()
+    results = profiler.run_full_analysis()
+
+    out_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "performance_analysis.json")
+    with open(out_path, 'w') as f:
+        json.dump(results, f, indent=2, default=_json_default)
+    print(f"\nresults written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
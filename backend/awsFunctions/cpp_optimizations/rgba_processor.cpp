@@ -14,8 +14,106 @@
 #include <omp.h>
 #endif
 
+#ifdef __AVX2__
+#include <immintrin.h>
+#endif
+
 namespace py = pybind11;
 
+/**
+ * raw BGR + mask -> RGBA kernel operating on in-memory buffers.
+ *
+ * AVX2 path: 8 pixels per iteration. _mm256_shuffle_epi8 swaps each
+ * 3-byte BGR triple into an RGB0 quad (one shuffle per 128-bit lane),
+ * the alpha bytes come from a cmpgt(mask, 0) widened into byte 3 of
+ * each dword - so 24 B of BGR + 8 B of mask become 32 B of RGBA without
+ * the separate cvtColor/cast/dstack passes. Scalar fallback otherwise.
+ */
+static void bgr_mask_to_rgba_kernel(
+    const uint8_t* __restrict__ bgr,
+    const uint8_t* __restrict__ mask,
+    uint8_t* __restrict__ rgba,
+    size_t n_pixels
+) {
+    size_t i = 0;
+
+#ifdef __AVX2__
+    // per-lane control: pixel p (base 3p) -> bytes {R=3p+2, G=3p+1, B=3p, zero}
+    const __m256i shuffle = _mm256_setr_epi8(
+        2, 1, 0, -1,  5, 4, 3, -1,  8, 7, 6, -1, 11, 10, 9, -1,
+        2, 1, 0, -1,  5, 4, 3, -1,  8, 7, 6, -1, 11, 10, 9, -1);
+    const __m128i zero128 = _mm_setzero_si128();
+
+    // keep >= 8 pixels of slack so the 16 B lane loads never read past the
+    // end of the BGR buffer; the scalar tail finishes the rest
+    if (n_pixels >= 16) {
+        for (; i + 16 <= n_pixels; i += 8) {
+            const uint8_t* src = bgr + i * 3;
+            // pixels 0-3 in the low lane, 4-7 in the high lane (12 B each)
+            __m256i bgr8 = _mm256_set_m128i(
+                _mm_loadu_si128(reinterpret_cast<const __m128i*>(src + 12)),
+                _mm_loadu_si128(reinterpret_cast<const __m128i*>(src)));
+            __m256i rgb0 = _mm256_shuffle_epi8(bgr8, shuffle);
+
+            // 8 mask bytes -> 0xFF/0x00, widened to byte 3 of each dword.
+            // cmpeq-against-zero then invert: cmpgt is a *signed* byte
+            // compare and would read mask values >= 128 (0/255 masks) as
+            // negative, zeroing their alpha while the scalar tail sets 255
+            __m128i m8 = _mm_loadl_epi64(reinterpret_cast<const __m128i*>(mask + i));
+            __m128i a8 = _mm_andnot_si128(_mm_cmpeq_epi8(m8, zero128),
+                                          _mm_set1_epi8(-1));
+            __m256i alpha = _mm256_slli_epi32(_mm256_cvtepu8_epi32(a8), 24);
+
+            _mm256_storeu_si256(reinterpret_cast<__m256i*>(rgba + i * 4),
+                                _mm256_or_si256(rgb0, alpha));
+        }
+    }
+#endif
+
+    for (; i < n_pixels; ++i) {
+        const size_t s = i * 3;
+        const size_t d = i * 4;
+        rgba[d + 0] = bgr[s + 2];
+        rgba[d + 1] = bgr[s + 1];
+        rgba[d + 2] = bgr[s + 0];
+        rgba[d + 3] = (mask[i] > 0) ? 255 : 0;
+    }
+}
+
+/**
+ * pybind wrapper: (H,W,3) BGR + (H,W) mask -> (H,W,4) RGBA numpy array
+ */
+static py::array_t<uint8_t> bgr_mask_to_rgba(
+    const py::array_t<uint8_t>& bgr,
+    const py::array_t<uint8_t>& mask
+) {
+    auto bgr_buf = bgr.request();
+    auto mask_buf = mask.request();
+
+    if (bgr_buf.ndim != 3 || bgr_buf.shape[2] != 3) {
+        throw std::invalid_argument("BGR array must have shape (H, W, 3)");
+    }
+    if (mask_buf.ndim != 2 ||
+        mask_buf.shape[0] != bgr_buf.shape[0] ||
+        mask_buf.shape[1] != bgr_buf.shape[1]) {
+        throw std::invalid_argument("Mask must have shape (H, W) matching the image");
+    }
+
+    const size_t height = bgr_buf.shape[0];
+    const size_t width = bgr_buf.shape[1];
+
+    py::array_t<uint8_t> rgba({height, width, static_cast<size_t>(4)});
+    auto rgba_buf = rgba.request();
+
+    bgr_mask_to_rgba_kernel(
+        static_cast<const uint8_t*>(bgr_buf.ptr),
+        static_cast<const uint8_t*>(mask_buf.ptr),
+        static_cast<uint8_t*>(rgba_buf.ptr),
+        height * width);
+
+    return rgba;
+}
+
 class RGBAProcessor {
 public:
     /**
@@ -292,4 +390,6 @@ PYBIND11_MODULE(torque_cpp, m) {
           "single image rgba processing");
     m.def("optimization_info", &RGBAProcessor::get_optimization_info,
           "system and compiler optimization information");
+    m.def("bgr_mask_to_rgba", &bgr_mask_to_rgba,
+          "fused AVX2 BGR+mask -> RGBA conversion on in-memory arrays");
 }
\ No newline at end of file
@@ -1,56 +1,106 @@
 import argparse
 import os
-import cv2
+import shutil
+import subprocess
+# aws_utils must come before cv2: importing it pins the OMP/BLAS thread
+# env vars, and the runtimes read those when cv2 pulls them in - this
+# module is both a direct entrypoint and the first step the worker loads
 from aws_utils import (
-    run_check, s3_download_dir, s3_upload_dir, patch_status,
-    get_image_files, JobPaths, print_job_summary
+    s3_download_dir, s3_upload_dir_filtered, patch_status,
+    get_image_files, resize_images_to_max_dimension,
+    JobPaths, print_job_summary, subprocess_env
 )
-from sam2_service import Sam2Service
+import cv2
+from sam2_service import get_sam2_service
+
+cv2.setUseOptimized(True)
+# One OpenCV-internal thread; the resize pool in aws_utils owns the cores
+cv2.setNumThreads(1)
 
 # actual job initialization
 
-def resize_images_to_max_dimension(images_dir: str, max_dimension: int = 1024):
+def _ffmpeg_has_nvenc() -> bool:
+    """True if the installed ffmpeg was built with the h264_nvenc encoder."""
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                                capture_output=True, text=True, timeout=10)
+        return "h264_nvenc" in result.stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def _pipe_frames_to_ffmpeg(image_files, images_dir, video_path, framerate,
+                           width, height, encoder_args) -> int:
+    """
+    Stream raw BGR frames into one ffmpeg process; returns its exit code.
+    If the encoder dies mid-stream the pipe write raises BrokenPipeError -
+    swallow it so the caller sees ffmpeg's exit code, not a stack trace.
+    """
+    ffmpeg_cmd = ["ffmpeg", "-y",
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "-s", f"{width}x{height}",
+        "-framerate", str(framerate),
+        "-i", "-",
+        *encoder_args,
+        "-pix_fmt", "yuv420p",
+        video_path]
+
+    print("▶", " ".join(ffmpeg_cmd))
+    proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE,
+                            env=subprocess_env())
+
+    try:
+        for image_file in image_files:
+            image = cv2.imread(os.path.join(images_dir, image_file))
+            if image is None:
+                print(f"Warning: Could not load {image_file}, skipping frame")
+                continue
+            if image.shape[:2] != (height, width):
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            proc.stdin.write(image.tobytes())
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    return proc.wait()
+
+
+def encode_video_from_images(images_dir: str, video_path: str, framerate: int = 12):
     """
-    Resize all images in directory to max dimension while preserving aspect ratio.
-    Processes images in-place to optimize storage and subsequent pipeline stages.
+    Encode the job images into an H.264 video by piping raw BGR frames
+    into a single ffmpeg process. Skips the intermediate re-decode ffmpeg
+    would do when reading the image files itself - each frame is decoded
+    once here and streamed straight to the encoder.
     """
     image_files = get_image_files(images_dir)
-    resized_count = 0
-    
-    for image_file in image_files:
-        image_path = os.path.join(images_dir, image_file)
-        
-        # Load image
-        image = cv2.imread(image_path)
-        if image is None:
-            print(f"Warning: Could not load {image_file}, skipping")
-            continue
-            
-        height, width = image.shape[:2]
-        
-        # Check if resize needed
-        if max(height, width) > max_dimension:
-            # Calculate new dimensions while preserving aspect ratio
-            if width > height:
-                new_width = max_dimension
-                new_height = int(height * (max_dimension / width))
-            else:
-                new_height = max_dimension
-                new_width = int(width * (max_dimension / height))
-            
-            # Resize image
-            resized_image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
-            # Save resized image (overwrite original)
-            cv2.imwrite(image_path, resized_image)
-            
-            print(f"Resized {image_file}: {width}x{height} → {new_width}x{new_height}")
-            resized_count += 1
-        else:
-            print(f"Kept {image_file}: {width}x{height} (already within {max_dimension}px)")
-    
-    print(f"Resized {resized_count}/{len(image_files)} images to max {max_dimension}px")
-    return resized_count
+    if not image_files:
+        raise ValueError(f"No image files found in {images_dir}")
+
+    first = cv2.imread(os.path.join(images_dir, image_files[0]))
+    if first is None:
+        raise ValueError(f"Could not load {image_files[0]}")
+    height, width = first.shape[:2]
+
+    # Prefer the T4's NVENC engine on g4dn workers - keeps the CPUs free for
+    # SAM2/COLMAP. Requires both a GPU and an ffmpeg built with the encoder;
+    # if the NVENC session still fails at runtime, retry on libx264 rather
+    # than hard-failing a job the CPU encoder could finish.
+    if shutil.which("nvidia-smi") and _ffmpeg_has_nvenc():
+        rc = _pipe_frames_to_ffmpeg(
+            image_files, images_dir, video_path, framerate, width, height,
+            ["-c:v", "h264_nvenc", "-preset", "p1", "-rc", "vbr", "-cq", "23"])
+        if rc == 0:
+            print(f"Encoded {len(image_files)} frames -> {video_path}")
+            return
+        print(f"NVENC encode failed (exit {rc}); retrying with libx264")
+
+    rc = _pipe_frames_to_ffmpeg(
+        image_files, images_dir, video_path, framerate, width, height,
+        ["-c:v", "libx264", "-threads", "2"])
+    if rc != 0:
+        raise RuntimeError(f"ffmpeg encoding failed for {video_path} (exit {rc})")
+
+    print(f"Encoded {len(image_files)} frames -> {video_path}")
 
 def init_job(job_id: str, bucket: str, fastapi_url: str, token: str):
     paths = JobPaths(job_id)
@@ -67,44 +117,45 @@ def init_job(job_id: str, bucket: str, fastapi_url: str, token: str):
     # Resize images to 1024px max dimension for pipeline optimization
     # resize_images_to_max_dimension(paths.images, max_dimension=1024)  # TEMPORARILY DISABLED
 
-    # SAM2 needs video, so imgs -> video
-    # Auto-detect input format (jpg or png)
-    sample_files = [f for f in os.listdir(paths.images) if f.startswith('0001.')]
-    if not sample_files:
-        raise FileNotFoundError("No images found starting with '0001.'")
-    
-    input_ext = sample_files[0].split('.')[-1]  # Get extension (jpg, png, etc.)
-    input_pattern = f"%04d.{input_ext}"
-    
-    print(f"Auto-detected input format: {input_ext}")
-    
-    run_check(["ffmpeg", "-y",
-        "-framerate", "12", 
-        "-i", os.path.join(paths.images, input_pattern),
-        "-c:v", "libx264",
-        "-pix_fmt", "yuv420p",
-        paths.video])
-    
+    # SAM2 needs video, so imgs -> video (raw frames piped into one ffmpeg)
+    encode_video_from_images(paths.images, paths.video)
+
     # first frame for preview / mask modification
     image_files = get_image_files(paths.images)
-    
+
     if not image_files:
         raise ValueError(f"No image files found in {paths.images}")
-    
+
     first_image_path = os.path.join(paths.images, image_files[0])
-    
-    run_check(["cp", first_image_path, paths.first_frame])
+
+    # shutil.copyfile uses an in-kernel copy (copy_file_range) - no cp fork
+    shutil.copyfile(first_image_path, paths.first_frame)
+
+    # Pre-resize once to SAM2's 1024px input; every refine click reuses
+    # this instead of re-decoding and downscaling the full-res frame
+    first = cv2.imread(paths.first_frame)
+    height, width = first.shape[:2]
+    if max(height, width) > 1024:
+        scale = 1024 / max(height, width)
+        first = cv2.resize(first, (int(width * scale), int(height * scale)),
+                           interpolation=cv2.INTER_AREA)
+        cv2.imwrite(paths.first_frame_small, first)
+    else:
+        shutil.copyfile(paths.first_frame, paths.first_frame_small)
 
     # init sam2service and segment first frame (NO PROMPTS)
-    svc = Sam2Service()
+    svc = get_sam2_service()
     print("▶ Running SAM2 on first frame for initial mask")
-    
+
     # save masks.npz to preview directory
-    mask_result = svc.img_mask(paths.first_frame, output_dir=paths.preview)
+    mask_result = svc.img_mask(paths.first_frame_small, output_dir=paths.preview)
+
+    # stash encoder features so refine_mask can skip the encoder pass
+    svc.save_embeddings(paths.embeddings)
     
     # create overlay for visual coolness
     preview_overlay = svc.overlay_outline(
-        image_path=paths.first_frame,
+        image_path=paths.first_frame_small,
         mask_path=paths.img_masks,
         out_dir=paths.preview,
     )
@@ -113,11 +164,21 @@ def init_job(job_id: str, bucket: str, fastapi_url: str, token: str):
 
     # Upload preview to S3 (exclude NPZ files - internal use only)
     s3_preview = f"s3://{bucket}/{job_id}/preview/"
-    run_check(["aws", "s3", "cp", paths.preview, s3_preview, "--recursive", "--exclude", "*.npz"])
+    s3_upload_dir_filtered(paths.preview, s3_preview, exclude=("*.npz",))
 
     patch_status(fastapi_url, token, job_id, "init_done")
     print("Job initialized successfully")
 
+def run_step(job_id: str, bucket: str, fastapi_url: str, fastapi_token: str,
+             video_url: str = None) -> bool:
+    """In-process entrypoint for the worker daemon - no interpreter fork."""
+    try:
+        init_job(job_id, bucket, fastapi_url, fastapi_token)
+        return True
+    except Exception as e:
+        print(f"init_job failed for {job_id}: {e}")
+        return False
+
 def main():
     parser = argparse.ArgumentParser(description="Initialize a SAM2 job")
 
@@ -0,0 +1,82 @@
+"""
+pipeline.py
+
+EC2 worker script that runs COLMAP + Brush back-to-back in one process:
+1. Sparse reconstruction on the RGBA images (run_colmap.run_colmap_pipeline)
+2. Brush Gaussian Splatting training (run_brush helpers)
+3. Upload final model + notify FastAPI once at the end
+
+Keeping both stages in a single long-lived process means CUDA context
+init and driver load are paid once instead of per-script, and with
+pycolmap installed the whole reconstruction shares that context too.
+"""
+import argparse
+import shutil
+from aws_utils import patch_status, s3_upload_dir, JobPaths, print_job_summary
+from run_colmap import run_colmap_pipeline
+from run_brush import setup_brush_inputs, run_brush_training, cleanup_intermediate_files
+
+# Warm the CUDA context up front so neither stage pays init mid-pipeline.
+try:
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.init()
+except ImportError:
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run COLMAP + Brush in one process")
+    parser.add_argument("--job_id", required=True, help="Job ID")
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
+    parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
+    parser.add_argument("--matching_type", default="Sequential",
+                       choices=["Sequential", "Exhaustive", "Spatial", "VocabTree"],
+                       help="COLMAP feature matching type")
+    parser.add_argument("--steps", default="10000", help="Training steps")
+    parser.add_argument("--eval_every", default="5000", help="Steps between eval renders")
+
+    args = parser.parse_args()
+
+    paths = JobPaths(args.job_id)
+
+    print_job_summary(args.job_id, "RUN PIPELINE",
+                     rgba_dir=paths.rgba,
+                     colmap_dir=paths.colmap,
+                     workspace=paths.workspace)
+
+    # Stage 1: COLMAP sparse reconstruction
+    if not run_colmap_pipeline(paths, args.matching_type):
+        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "colmap_failed")
+        print(f"ERROR: COLMAP failed for job {args.job_id}")
+        return 1
+    patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "colmap_done")
+
+    # Stage 2: Brush training - same process, CUDA ctx already live
+    try:
+        brush_data_dir = setup_brush_inputs(paths)
+        output_dir = run_brush_training(brush_data_dir, args.steps, args.bucket,
+                                        args.job_id, args.eval_every)
+        final_model_dir = cleanup_intermediate_files(paths, output_dir)
+
+        if final_model_dir:
+            print("Uploading final 3D model to S3...")
+            s3_model_prefix = f"s3://{args.bucket}/{args.job_id}/gaussian_splat/"
+            s3_upload_dir(final_model_dir, s3_model_prefix)
+            print(f"Model uploaded to: {s3_model_prefix}")
+            # tmpfs exports are RAM - release it once the model is in S3
+            if final_model_dir.startswith("/dev/shm/"):
+                shutil.rmtree(final_model_dir, ignore_errors=True)
+
+        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "brush_done")
+        print(f"SUCCESS: pipeline completed for job {args.job_id}")
+        return 0
+
+    except Exception as e:
+        print(f"ERROR: Brush training failed: {e}")
+        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "brush_failed")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,9 +1,10 @@
 import argparse
+import os
 from aws_utils import (
-    s3_download_file, s3_upload_file, patch_status,
+    s3_download_if_changed, s3_upload_file, patch_status,
     throwFNF, load_points_json, JobPaths, print_job_summary
 )
-from sam2_service import Sam2Service
+from sam2_service import get_sam2_service
 
 """
 Runs on EC2 to regenerate preview mask whenever user updates points.
@@ -31,18 +32,26 @@ def main():
                      preview_dir=paths.preview,
                      config_dir=paths.config)
 
-    # load 1st frame image
-    throwFNF(paths.first_frame)
+    # load 1st frame image - prefer the 1024px copy init_job pre-resized
+    # (older jobs predate it, so fall back to the full-res frame)
+    first_frame = paths.first_frame_small \
+        if os.path.exists(paths.first_frame_small) else paths.first_frame
+    throwFNF(first_frame)
 
     # download latest updated prompts @ config/initial_points.json
+    # (etag check - re-refines with unchanged points skip the transfer)
     s3_url_pts = f"s3://{bucket}/{job_id}/config/initial_points.json"
-    s3_download_file(s3_url_pts, paths.points_json)
+    s3_download_if_changed(s3_url_pts, paths.points_json)
     points, labels = load_points_json(paths.points_json)
 
     # generate mask npz + merged mask png as preview/img_masks.npz
-    svc = Sam2Service()
+    # (cached service - repeated refines in one process reuse the weights)
+    svc = get_sam2_service()
+
+    # reuse the first-frame encoder features saved by init_job when possible
+    svc.load_embeddings(paths.embeddings)
     masks_path = svc.img_mask(
-        image_path=paths.first_frame,
+        image_path=first_frame,
         output_dir=paths.preview,
         points=points,
         labels=labels
@@ -50,7 +59,7 @@ def main():
 
     # to preview/first_frame_outlined.png
     overlay_path = svc.overlay_outline(
-        image_path=paths.first_frame,
+        image_path=first_frame,
         mask_path=masks_path,
         out_dir=paths.preview
     )
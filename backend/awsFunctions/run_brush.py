@@ -11,14 +11,25 @@ EC2 worker script to:
 """
 import argparse
 import os
+import queue
+import re
 import shutil
 import threading
 import time
 from aws_utils import (
-    run, patch_status, ensure_dir, s3_upload_dir,
+    run, patch_status, ensure_dir, s3_upload_dir, s3_upload_file,
     JobPaths, print_job_summary
 )
 
+# Event-driven progress uploads when watchdog is installed; the thread then
+# parks on an inotify fd instead of waking every 5 minutes.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
 
 def setup_brush_inputs(paths: JobPaths):
     """
@@ -42,19 +53,20 @@ def setup_brush_inputs(paths: JobPaths):
     if not os.path.exists(colmap_sparse_source):
         raise FileNotFoundError(f"COLMAP sparse directory not found: {colmap_sparse_source}")
     
-    # check brush_data good
-    ensure_dir(brush_input_dir)
+    # check brush_data good - makedirs creates brush_input_dir on the way
     ensure_dir(brush_sparse_dir)
     
-    # remove existing symlinks if they exist
-    if os.path.exists(brush_images_link):
-        os.unlink(brush_images_link)
-    if os.path.exists(brush_sparse_link):
-        os.unlink(brush_sparse_link)
-    
-    # symlinks
-    os.symlink(paths.rgba, brush_images_link)
-    os.symlink(colmap_sparse_source, brush_sparse_link)
+    # symlinks - reuse ones that already point at the right target so
+    # re-runs don't churn the directory
+    for link, target in ((brush_images_link, paths.rgba),
+                         (brush_sparse_link, colmap_sparse_source)):
+        if os.path.islink(link):
+            if os.readlink(link) == target:
+                continue
+            os.unlink(link)
+        elif os.path.exists(link):
+            os.unlink(link)
+        os.symlink(target, link)
     
     print("Brush data structure created with symlinks")
     return brush_input_dir
@@ -62,31 +74,86 @@ def setup_brush_inputs(paths: JobPaths):
 def upload_progress_images(progress_dir: str, bucket: str, job_id: str, stop_event: threading.Event):
     """
     Background thread to upload progress images every 5 minutes.
+    Remembers what already went up, so each tick only sends new renders
+    instead of re-uploading every eval image ever produced.
     """
-    while not stop_event.is_set():
-        try:
-            if os.path.exists(progress_dir):
-                # Find latest rendered images
-                image_files = [f for f in os.listdir(progress_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-                if image_files:
-                    # Upload latest images to S3 progress folder
-                    s3_progress_prefix = f"s3://{bucket}/{job_id}/progress/"
-                    s3_upload_dir(progress_dir, s3_progress_prefix)
-                    print(f"Uploaded {len(image_files)} progress images to S3")
-        except Exception as e:
-            print(f"Progress upload error: {e}")
-        
-        # Wait 5 minutes or until stop signal
-        stop_event.wait(300)  # 300 seconds = 5 minutes
+    s3_progress_prefix = f"s3://{bucket}/{job_id}/progress/"
+    uploaded = set()
+
+    def upload_new():
+        if not os.path.exists(progress_dir):
+            return
+        # Find rendered images not uploaded previously
+        with os.scandir(progress_dir) as it:
+            current = {e.name for e in it
+                       if e.is_file() and e.name.lower().endswith(('.png', '.jpg', '.jpeg'))}
+        new_files = current - uploaded
+        for name in sorted(new_files):
+            s3_upload_file(os.path.join(progress_dir, name),
+                           s3_progress_prefix + name)
+        if new_files:
+            uploaded |= new_files
+            print(f"Uploaded {len(new_files)} new progress images to S3")
+
+    if Observer is None:
+        # Polling fallback: wake every 5 minutes
+        while not stop_event.is_set():
+            try:
+                upload_new()
+            except Exception as e:
+                print(f"Progress upload error: {e}")
+            stop_event.wait(300)  # 300 seconds = 5 minutes
+        return
+
+    # inotify path: Brush writes wake us, bursts coalesce for 2 seconds so
+    # one eval dump becomes one upload batch instead of one per file
+    events = queue.Queue()
 
-def run_brush_training(brush_data_dir: str, total_steps: str = "10000", bucket: str = None, job_id: str = None):
+    class _ProgressHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                events.put(event.src_path)
+
+    observer = Observer()
+    observer.schedule(_ProgressHandler(), progress_dir)
+    observer.start()
+    try:
+        while not stop_event.is_set():
+            try:
+                events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + 2.0  # debounce window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            try:
+                upload_new()
+            except Exception as e:
+                print(f"Progress upload error: {e}")
+    finally:
+        observer.stop()
+        observer.join()
+
+def run_brush_training(brush_data_dir: str, total_steps: str = "10000", bucket: str = None, job_id: str = None, eval_every: str = "5000"):
     """
     Run Brush Gaussian Splatting training on the prepared dataset.
     """
     print("Starting Brush training...")
     
-    # Set up export path for outputs and progress
+    # Set up export path for outputs and progress. PLYs run 100 MB-2 GB,
+    # so prefer the RAM-backed tmpfs over EBS when it has headroom - the
+    # export then hits memory bandwidth and skips the EBS round-trip
+    # before the S3 upload. Caller removes the tmpfs dir after upload.
     export_dir = os.path.join(os.path.dirname(brush_data_dir), "gaussian_splat")
+    if job_id and os.path.isdir("/dev/shm") \
+            and shutil.disk_usage("/dev/shm").free > 2 * 1024 ** 3:
+        export_dir = os.path.join("/dev/shm", "brush_out", job_id)
     progress_dir = os.path.join(os.path.dirname(brush_data_dir), "progress")
     ensure_dir(export_dir)
     ensure_dir(progress_dir)
@@ -114,19 +181,26 @@ def run_brush_training(brush_data_dir: str, total_steps: str = "10000", bucket:
         "--export-path", export_dir,
         "--export-name", "export_{iter}.ply",
         "--alpha-loss-weight", "0.1",  # For transparency support
-        # "--eval-every", "1000",                    # DISABLED
-        # "--eval-save-to-disk",  # Save eval images to disk for progress  # DISABLED
-        "--seed", "42"
     ]
+
+    # Eval renders only pay off when something consumes them; with the
+    # progress-upload thread disabled they'd just burn render time and
+    # disk, so key the flags off the thread actually running
+    if upload_thread is not None:
+        brush_cmd += ["--eval-every", eval_every, "--eval-save-to-disk"]
+
+    brush_cmd += ["--seed", "42"]
     
     print(f"Running: {' '.join(brush_cmd)}")
     print(f"Export directory: {export_dir}")
     print(f"Progress directory: {progress_dir}")
     
     try:
-        # Run Brush training
-        result = run(' '.join(brush_cmd))
-        
+        # Run Brush training (list form - execs directly, no shell re-parse).
+        # Watchdog kills a wedged run after an hour - the old per-step
+        # subprocess timeout - rather than pinning the worker slot forever.
+        result = run(brush_cmd, timeout=3600)
+
         if result != 0:
             raise RuntimeError(f"Brush training failed with exit code {result}")
         
@@ -142,12 +216,16 @@ def run_brush_training(brush_data_dir: str, total_steps: str = "10000", bucket:
         pass
     
     # Check for exported PLY files
-    ply_files = [f for f in os.listdir(export_dir) if f.endswith('.ply')]
+    with os.scandir(export_dir) as it:
+        ply_files = [e.name for e in it if e.is_file() and e.name.endswith('.ply')]
     if ply_files:
         print(f"Found {len(ply_files)} exported PLY files")
-        # Get the final model (highest iteration)
-        ply_files.sort()
-        final_model = ply_files[-1]
+        # Get the final model (highest iteration) - numeric key, since
+        # lexicographic order would rank export_9000 above export_10000
+        def export_iter(name):
+            match = re.search(r"(\d+)", name)
+            return int(match.group(1)) if match else -1
+        final_model = max(ply_files, key=export_iter)
         print(f"Final model: {final_model}")
     else:
         print("WARNING: No PLY files found in export directory")
@@ -178,50 +256,62 @@ def cleanup_intermediate_files(paths: JobPaths, output_dir: str):
     
     return None
 
-def main():
-    parser = argparse.ArgumentParser(description="Run Brush 3D Gaussian Splatting training")
-    parser.add_argument("--job_id", required=True, help="Job ID")
-    parser.add_argument("--bucket", required=True, help="S3 bucket name")
-    parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
-    parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
-    parser.add_argument("--steps", default="10000", help="Training steps")
-    parser.add_argument("--resolution", default="1024", help="Output resolution")
-    
-    args = parser.parse_args()
-    
-    paths = JobPaths(args.job_id)
-    
-    print_job_summary(args.job_id, "RUN BRUSH",
+def run_step(job_id: str, bucket: str, fastapi_url: str, fastapi_token: str,
+             steps: str = "10000", eval_every: str = "5000") -> bool:
+    """In-process entrypoint for the worker daemon - no interpreter fork."""
+    paths = JobPaths(job_id)
+
+    print_job_summary(job_id, "RUN BRUSH",
                      rgba_dir=paths.rgba,
                      colmap_dir=paths.colmap,
                      workspace=paths.workspace)
- 
+
     try:
         # Step 1: set up Brush data structure
         brush_data_dir = setup_brush_inputs(paths)
-        
+
         # Step 2: run brush training
-        output_dir = run_brush_training(brush_data_dir, args.steps, args.bucket, args.job_id)
-        
+        output_dir = run_brush_training(brush_data_dir, steps, bucket,
+                                        job_id, eval_every)
+
         # Step 3: clean up + finalize out
         final_model_dir = cleanup_intermediate_files(paths, output_dir)
-        
+
         if final_model_dir:
             # Step 4: upload final model to S3
             print("Uploading final 3D model to S3...")
-            s3_model_prefix = f"s3://{args.bucket}/{args.job_id}/gaussian_splat/"
+            s3_model_prefix = f"s3://{bucket}/{job_id}/gaussian_splat/"
             s3_upload_dir(final_model_dir, s3_model_prefix)
             print(f"Model uploaded to: {s3_model_prefix}")
+            # tmpfs exports are RAM - release it once the model is in S3
+            if final_model_dir.startswith("/dev/shm/"):
+                shutil.rmtree(final_model_dir, ignore_errors=True)
 
         # Step 5: update job status
-        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "brush_done")
-        print(f"SUCCESS: Brush training completed for job {args.job_id}")
-        return 0
-        
+        patch_status(fastapi_url, fastapi_token, job_id, "brush_done")
+        print(f"SUCCESS: Brush training completed for job {job_id}")
+        return True
+
     except Exception as e:
         print(f"ERROR: Brush training failed: {e}")
-        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "brush_failed")
-        return 1
+        patch_status(fastapi_url, fastapi_token, job_id, "brush_failed")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Brush 3D Gaussian Splatting training")
+    parser.add_argument("--job_id", required=True, help="Job ID")
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
+    parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
+    parser.add_argument("--steps", default="10000", help="Training steps")
+    parser.add_argument("--resolution", default="1024", help="Output resolution")
+    parser.add_argument("--eval_every", default="5000", help="Steps between eval renders")
+
+    args = parser.parse_args()
+
+    success = run_step(args.job_id, args.bucket, args.fastapi_url,
+                       args.fastapi_token, args.steps, args.eval_every)
+    return 0 if success else 1
 
 if __name__ == "__main__":
     exit(main())
@@ -15,17 +15,34 @@ from aws_utils import (
     JobPaths, print_job_summary
 )
 
+# In-process COLMAP when the bindings are installed: one CUDA/SIFT init for
+# the whole pipeline instead of per-stage subprocess forks.
+try:
+    import pycolmap
+except ImportError:
+    pycolmap = None
+
+# Vocab tree shipped on the worker AMI; enables O(N log N) matching
+VOCAB_TREE_PATH = "/opt/colmap/vocab_tree_flickr100K_words256K.bin"
+
+
+def gpu_count() -> int:
+    """Number of visible NVIDIA GPUs (0 when nvidia-smi is absent)."""
+    import subprocess
+    try:
+        out = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True)
+        return sum(1 for line in out.stdout.splitlines() if line.startswith("GPU"))
+    except OSError:
+        return 0
+
 def run_colmap_pipeline(paths: JobPaths, matching_type: str = "Sequential"):
     """
     Runs COLMAP pipeline on RGBA images.
     """
-    # create colmap directory (COLMAP creates sparse/0)
-    ensure_dir(paths.colmap)
-    
     db_path = os.path.join(paths.colmap, "database.db")
     sparse_path = os.path.join(paths.colmap, "sparse")
-    
-    # Create sparse directory
+
+    # one makedirs covers colmap/ and colmap/sparse (COLMAP creates sparse/0)
     ensure_dir(sparse_path)
     
     print(f"Running COLMAP pipeline")
@@ -44,25 +61,73 @@ def run_colmap_pipeline(paths: JobPaths, matching_type: str = "Sequential"):
     if len(rgba_files) < 3:
         print(f"ERROR: Need at least 3 images, found {len(rgba_files)}")
         return False
-    
-    # COLMAP pipeline
-    commands = [
-        ("Creating database", f"colmap database_creator --database_path {db_path}"),
-        ("Extracting features", f"colmap feature_extractor --database_path {db_path} --image_path {paths.rgba}"),
-        (f"Running {matching_type} matching", {
-            "Exhaustive": f"colmap exhaustive_matcher --database_path {db_path}",
-            "Sequential": f"colmap sequential_matcher --database_path {db_path}",
-            "Spatial": f"colmap spatial_matcher --database_path {db_path}"
-        }.get(matching_type, f"colmap sequential_matcher --database_path {db_path}")),
-        ("Sparse reconstruction", f"colmap mapper --database_path {db_path} --image_path {paths.rgba} --output_path {sparse_path}")
-    ]
-    
-    for step, cmd in commands:
-        print(step)
-        if run(cmd) != 0:
-            print(f"ERROR: Failed during {step.lower()}")
+
+    # Exhaustive matching is O(N^2); past ~100 frames switch to the vocab
+    # tree (O(N log N)) when it's present on the instance
+    if len(rgba_files) > 100 and matching_type == "Exhaustive" \
+            and os.path.exists(VOCAB_TREE_PATH):
+        print(f"{len(rgba_files)} images - switching Exhaustive -> VocabTree matching")
+        matching_type = "VocabTree"
+
+    num_gpus = gpu_count()
+
+    if pycolmap is not None:
+        # one process end-to-end: no CUDA re-init or SIFT reload per stage
+        try:
+            print("Extracting features (pycolmap)")
+            pycolmap.extract_features(db_path, paths.rgba)
+            print(f"Running {matching_type} matching (pycolmap)")
+            matcher = {
+                "Exhaustive": pycolmap.match_exhaustive,
+                "Sequential": pycolmap.match_sequential,
+                "Spatial": pycolmap.match_spatial,
+                "VocabTree": getattr(pycolmap, "match_vocabtree",
+                                     pycolmap.match_sequential),
+            }.get(matching_type, pycolmap.match_sequential)
+            matcher(db_path)
+            print("Sparse reconstruction (pycolmap)")
+            pycolmap.incremental_mapping(db_path, paths.rgba, sparse_path)
+        except Exception as e:
+            print(f"ERROR: pycolmap pipeline failed: {e}")
             return False
-   
+    else:
+        # COLMAP pipeline via the CLI (fallback when bindings are missing)
+        # spread SIFT extraction over every visible GPU
+        sift_flags = ["--SiftExtraction.max_image_size", "2048"]
+        if num_gpus > 0:
+            gpu_index = ",".join(str(i) for i in range(num_gpus))
+            sift_flags += ["--SiftExtraction.use_gpu", "1",
+                           "--SiftExtraction.gpu_index", gpu_index]
+
+        # list-form commands exec colmap directly - no shell fork or
+        # re-quoting, and paths with spaces stay intact
+        commands = [
+            ("Creating database",
+             ["colmap", "database_creator", "--database_path", db_path]),
+            ("Extracting features",
+             ["colmap", "feature_extractor", "--database_path", db_path,
+              "--image_path", paths.rgba] + sift_flags),
+            (f"Running {matching_type} matching", {
+                "Exhaustive": ["colmap", "exhaustive_matcher", "--database_path", db_path],
+                "Sequential": ["colmap", "sequential_matcher", "--database_path", db_path],
+                "Spatial": ["colmap", "spatial_matcher", "--database_path", db_path],
+                "VocabTree": ["colmap", "vocab_tree_matcher", "--database_path", db_path,
+                              "--VocabTreeMatching.vocab_tree_path", VOCAB_TREE_PATH],
+            }.get(matching_type,
+                  ["colmap", "sequential_matcher", "--database_path", db_path])),
+            ("Sparse reconstruction",
+             ["colmap", "mapper", "--database_path", db_path,
+              "--image_path", paths.rgba, "--output_path", sparse_path]),
+        ]
+
+        for step, cmd in commands:
+            print(step)
+            # hour cap per stage (the old per-step subprocess timeout) -
+            # a hung matcher/mapper fails the job instead of the worker
+            if run(cmd, timeout=3600) != 0:
+                print(f"ERROR: Failed during {step.lower()}")
+                return False
+
     # verify output
     result_dir = os.path.join(sparse_path, "0")
     expected_files = ["cameras.bin", "images.bin", "points3D.bin"]
@@ -80,35 +145,41 @@ def run_colmap_pipeline(paths: JobPaths, matching_type: str = "Sequential"):
     print(f"Results: {result_dir}")
     return True
 
+def run_step(job_id: str, bucket: str, fastapi_url: str, fastapi_token: str,
+             matching_type: str = "Sequential") -> bool:
+    """In-process entrypoint for the worker daemon - no interpreter fork."""
+    paths = JobPaths(job_id)
+
+    print_job_summary(job_id, "RUN COLMAP",
+                     rgba_dir=paths.rgba,
+                     colmap_dir=paths.colmap)
+
+    # Run COLMAP pipeline
+    success = run_colmap_pipeline(paths, matching_type)
+
+    if success:
+        patch_status(fastapi_url, fastapi_token, job_id, "colmap_done")
+        print(f"SUCCESS: COLMAP completed for job {job_id}")
+    else:
+        patch_status(fastapi_url, fastapi_token, job_id, "colmap_failed")
+        print(f"ERROR: COLMAP failed for job {job_id}")
+    return success
+
 def main():
     parser = argparse.ArgumentParser(description="Run COLMAP reconstruction on RGBA images")
     parser.add_argument("--job_id", required=True, help="Job ID")
     parser.add_argument("--bucket", required=True, help="S3 bucket name")
     parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
     parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
-    parser.add_argument("--matching_type", default="Sequential", 
-                       choices=["Sequential", "Exhaustive", "Spatial"],
+    parser.add_argument("--matching_type", default="Sequential",
+                       choices=["Sequential", "Exhaustive", "Spatial", "VocabTree"],
                        help="COLMAP feature matching type")
-    
+
     args = parser.parse_args()
-    
-    paths = JobPaths(args.job_id)
-    
-    print_job_summary(args.job_id, "RUN COLMAP",
-                     rgba_dir=paths.rgba,
-                     colmap_dir=paths.colmap)
-    
-    # Run COLMAP pipeline
-    success = run_colmap_pipeline(paths, args.matching_type)
-    
-    if success:
-        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "colmap_done")
-        print(f"SUCCESS: COLMAP completed for job {args.job_id}")
-        return 0
-    else:
-        patch_status(args.fastapi_url, args.fastapi_token, args.job_id, "colmap_failed")
-        print(f"ERROR: COLMAP failed for job {args.job_id}")
-        return 1
+
+    success = run_step(args.job_id, args.bucket, args.fastapi_url,
+                       args.fastapi_token, args.matching_type)
+    return 0 if success else 1
 
 if __name__ == "__main__":
     exit(main())
\ No newline at end of file
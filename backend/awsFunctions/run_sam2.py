@@ -13,24 +13,20 @@ import os
 from aws_utils import (
     patch_status, load_points_json, JobPaths, print_job_summary
 )
-from sam2_service import Sam2Service
+from sam2_service import get_sam2_service
 
 # main execution
 
-def main():
-    parser = argparse.ArgumentParser(description="Run SAM2 on a video propogation + RGBA composite for a job.")
-    parser.add_argument("--job_id", required=True, help="Job ID")
-    parser.add_argument("--bucket", required=True, help="S3 bucket name")
-    parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
-    parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
-    
-    args = parser.parse_args()
-
-    job_id = args.job_id
-    bucket = args.bucket
-    fastapi_url = args.fastapi_url
-    token = args.fastapi_token
+def run_step(job_id: str, bucket: str, fastapi_url: str, fastapi_token: str) -> bool:
+    """In-process entrypoint for the worker daemon - keeps SAM2 warm."""
+    try:
+        run_sam2(job_id, bucket, fastapi_url, fastapi_token)
+        return True
+    except Exception as e:
+        print(f"run_sam2 failed for {job_id}: {e}")
+        return False
 
+def run_sam2(job_id: str, bucket: str, fastapi_url: str, token: str):
     paths = JobPaths(job_id)
     paths.ensure_dirs("rgba")
     
@@ -48,29 +44,37 @@ def main():
     points, labels = load_points_json(paths.points_json)
 
     # Initialize SAM2 service
-    svc = Sam2Service()
+    svc = get_sam2_service()
 
-    # Run SAM2 to get masks
-    masks_path = svc.video_mask(
+    # SAM2 propagation, RGBA compositing and S3 upload run as one
+    # producer-consumer pipeline - compositing starts on frame 0 instead
+    # of waiting for the whole video to propagate
+    results = svc.process_video_pipelined(
         video_path=paths.video,
         job_id=job_id,
         points=points,
-        labels=labels
-    )
-
-    # use masks to create rgba images (c++ optimized when available)
-    results = svc.batch_create_rgba_masks_optimized(
-        job_id=job_id,
+        labels=labels,
         upload_to_s3=True,
         s3_bucket=bucket,
         s3_prefix=f"{job_id}/rgba",
     )
-    
+
     print(f"RGBA processing complete: {results['processed']} images, {results['uploaded']} uploaded")
         
     # Notify FastAPI of job completion
     patch_status(fastapi_url, token, job_id, "sam2_done")
     print(f"SUCCESS: SAM2 completed for job {job_id}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Run SAM2 on a video propogation + RGBA composite for a job.")
+    parser.add_argument("--job_id", required=True, help="Job ID")
+    parser.add_argument("--bucket", required=True, help="S3 bucket name")
+    parser.add_argument("--fastapi_url", required=True, help="FastAPI URL")
+    parser.add_argument("--fastapi_token", required=True, help="FastAPI auth token")
+
+    args = parser.parse_args()
+
+    run_sam2(args.job_id, args.bucket, args.fastapi_url, args.fastapi_token)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
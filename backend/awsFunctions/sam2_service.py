@@ -1,11 +1,86 @@
+import contextlib
+import functools
+import io
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import cv2
 import numpy as np
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+import torch
 from ultralytics import SAM
 from ultralytics.models.sam import SAM2VideoPredictor
 from typing import Optional, List, Tuple
 
+# PyAV threaded video decode (graceful fallback to the predictor's own
+# single-threaded OpenCV reader)
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    av = None
+    AV_AVAILABLE = False
+
+
+def _decode_video_frames(video_path: str) -> list:
+    """
+    Decode every frame to BGR with PyAV's frame/slice-threaded decoder.
+    The predictor's default cv2 reader decodes on one core and serializes
+    with inference; this front-loads decode across all cores.
+    """
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        return [frame.to_ndarray(format="bgr24")
+                for frame in container.decode(stream)]
+
+
+# nvJPEG GPU decode via torchvision (graceful fallback to cv2)
+try:
+    from torchvision.io import decode_jpeg
+    TORCHVISION_AVAILABLE = True
+except ImportError:
+    TORCHVISION_AVAILABLE = False
+
+
+def _decode_image_bgr(image_path: str):
+    """
+    Decode an image to BGR. JPEGs on CUDA hosts go through nvJPEG
+    (torchvision decode_jpeg), taking the per-frame decode off the CPU
+    cores that the compositing thread pool is using; everything else
+    falls back to cv2.imread.
+    """
+    if (TORCHVISION_AVAILABLE and torch.cuda.is_available()
+            and image_path.lower().endswith(('.jpg', '.jpeg'))):
+        try:
+            data = np.fromfile(image_path, dtype=np.uint8)
+            rgb = decode_jpeg(torch.from_numpy(data), device="cuda")  # (3,H,W)
+            return rgb.permute(1, 2, 0).flip(-1).contiguous().cpu().numpy()
+        except Exception:
+            pass  # unsupported variant - let cv2 try
+    return cv2.imread(image_path)
+
+
+# numba-compiled compositing kernel (graceful fallback to numpy)
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True, nogil=True)
+    def _bgra_fill(bgr, mask, out):
+        """Fused copy + alpha threshold: one pass over the frame, all cores."""
+        for i in prange(bgr.shape[0]):
+            for j in range(bgr.shape[1]):
+                out[i, j, 0] = bgr[i, j, 0]
+                out[i, j, 1] = bgr[i, j, 1]
+                out[i, j, 2] = bgr[i, j, 2]
+                out[i, j, 3] = 255 if mask[i, j] else 0
+
 # c++ optimization support (graceful fallback to python)
 try:
     import torque_cpp
@@ -17,8 +92,100 @@ except ImportError as e:
     CPP_AVAILABLE = False
     print(f"c++ optimization not available, using python fallback: {e}")
 
+def save_masks_npz(path: str, masks: np.ndarray):
+    """
+    Save binary masks bit-packed (1 bit/pixel) without DEFLATE.
+    savez_compressed burns CPU deflating what packbits shrinks 8x for
+    free, and the smaller payload also cuts S3 upload bytes.
+    """
+    if masks.dtype != np.bool_:
+        masks = masks > 0  # packbits takes bool directly - no uint8 copy
+    np.savez(path, packed=np.packbits(masks, axis=-1),
+             shape=np.array(masks.shape))
+
+
+def _decode_masks_npz(path: str) -> np.ndarray:
+    """Decode a mask NPZ (bit-packed or legacy dense layout)."""
+    data = np.load(path)
+    if isinstance(data, np.lib.npyio.NpzFile) and "packed" in data.files:
+        shape = tuple(data["shape"])
+        return np.unpackbits(data["packed"], axis=-1,
+                             count=shape[-1]).reshape(shape)
+    if isinstance(data, np.lib.npyio.NpzFile):
+        return data[list(data.keys())[0]]
+    return data
+
+
+@functools.lru_cache(maxsize=4)
+def _load_masks_cached(path: str, _mtime_ns: int) -> np.ndarray:
+    """Cached decode; mtime in the key invalidates on rewrite."""
+    return _decode_masks_npz(path)
+
+
+# Only small NPZs go through the cache. Bit-packed payloads unpack to 8x
+# their on-disk size, so a multi-frame video_masks.npz at native
+# resolution decodes to GBs - four pinned entries would blow the 16 GB
+# g4dn's RAM. Single-frame img_masks stay well under this cap.
+_MASK_CACHE_MAX_FILE_BYTES = 16 * 1024 * 1024
+
+
+def load_masks_npz(path: str) -> np.ndarray:
+    """
+    Load masks saved by save_masks_npz; handles the legacy dense layout.
+    Small decodes are cached on (path, mtime) - overlay and RGBA helpers
+    called in a loop reuse one decode instead of re-unpacking per call -
+    while large video-mask arrays are decoded fresh so the cache never
+    pins them in memory.
+    """
+    st = os.stat(path)
+    if st.st_size <= _MASK_CACHE_MAX_FILE_BYTES:
+        return _load_masks_cached(path, st.st_mtime_ns)
+    return _decode_masks_npz(path)
+
+
+def _list_job_images(images_dir: str):
+    """
+    Sorted frame listing in one scandir pass. Returns (names, full paths)
+    so loop bodies index instead of re-joining strings per frame, and the
+    DirEntry filter avoids the extra stat listdir-based checks would pay.
+    """
+    with os.scandir(images_dir) as it:
+        entries = [e for e in it
+                   if e.name.lower().endswith(('.jpg', '.jpeg', '.png', '.heic'))
+                   and not e.name.endswith('_video.mp4')]
+    entries.sort(key=lambda e: e.name)  # Sequential ordering maintained
+    return [e.name for e in entries], [e.path for e in entries]
+
+
+# Per-file transfer config for uploads issued inside a thread pool - the
+# outer pool supplies the concurrency, so boto3's own threads stay off.
+_UPLOAD_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                use_threads=False)
+
+# process-wide cached service (see get_sam2_service below)
+_service_instance = None
+_service_lock = threading.Lock()
+
+
+def get_sam2_service() -> "Sam2Service":
+    """
+    Return the process-wide Sam2Service, constructing it on first use.
+    Loading the SAM2 checkpoint takes hundreds of MB and seconds of wall
+    time, so anything long-running (worker loops, the FastAPI backend)
+    should reuse one instance instead of re-instantiating per request.
+    The lock keeps concurrent worker threads from double-loading the
+    checkpoint on first use.
+    """
+    global _service_instance
+    if _service_instance is None:
+        with _service_lock:
+            if _service_instance is None:
+                _service_instance = Sam2Service()
+    return _service_instance
+
+
 class Sam2Service:
-    
+
     def __init__(self):
         # Model paths
         sam2_model_path = os.path.expanduser("~/torque/models/sam2.1_b.pt")
@@ -33,19 +200,162 @@ class Sam2Service:
             model=sam2_model_path
             )
         )
-        self.s3 = boto3.client('s3')
-    
+        # pool sized past the 16 concurrent upload threads so PUTs never
+        # queue on connections; adaptive retries + TCP keep-alive avoid
+        # re-handshakes across a job's hundreds of uploads
+        self.s3 = boto3.client('s3', config=BotoConfig(
+            max_pool_connections=64,
+            retries={'max_attempts': 10, 'mode': 'adaptive'},
+            tcp_keepalive=True,
+        ))
+        # which image the underlying predictor currently holds encoder
+        # features for (None until the first img_mask call)
+        self._embedded_image = None
+
+        # mixed precision: TF32 matmuls plus bf16 (fp16 pre-Ampere) autocast
+        # around inference - halves encoder memory bandwidth on the GPU
+        self._autocast_dtype = None
+        if torch.cuda.is_available():
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            self._autocast_dtype = (torch.bfloat16 if torch.cuda.is_bf16_supported()
+                                    else torch.float16)
+
+        # compile the image encoder when torch.compile is available - the
+        # encoder dominates SAM2 runtime, and its shapes are static here
+        encoder = getattr(getattr(self.sam_img, "model", None), "image_encoder", None)
+        if encoder is not None and hasattr(torch, "compile"):
+            try:
+                # dynamic=False: inputs are always letterboxed to 1024^2,
+                # so pin the shape - no guard checks or re-tracing, and
+                # inductor can capture CUDA graphs
+                self.sam_img.model.image_encoder = torch.compile(
+                    encoder, mode="reduce-overhead", dynamic=False)
+                print("compiled SAM2 image encoder")
+            except Exception as e:
+                print(f"torch.compile skipped for image encoder: {e}")
+
+        # compile the video model as well - propagation replays the same
+        # static-shape graph every frame, so autotuning amortizes fast
+        video_model = getattr(self.sam_video, "model", None)
+        if (video_model is not None and not isinstance(video_model, str)
+                and torch.cuda.is_available() and hasattr(torch, "compile")):
+            try:
+                self.sam_video.model = torch.compile(video_model,
+                                                     mode="max-autotune",
+                                                     dynamic=False)
+                print("compiled SAM2 video model")
+            except Exception as e:
+                print(f"torch.compile skipped for video model: {e}")
+
+        # Warm-up: run the encoder once at the canonical 1024x1024 shape so
+        # kernel selection / dynamo compilation happens at construction, not
+        # on the first job's clock
+        if torch.cuda.is_available():
+            try:
+                dummy = torch.zeros(1, 3, 1024, 1024, device="cuda")
+                with self._inference_ctx():
+                    self.sam_img.model.image_encoder(dummy)
+                torch.cuda.synchronize()
+                print("SAM2 image encoder warmed up")
+            except Exception as e:
+                print(f"encoder warm-up skipped: {e}")
+
+    @contextlib.contextmanager
+    def _inference_ctx(self):
+        """inference_mode (+ bf16/fp16 autocast on CUDA) for predict calls."""
+        with torch.inference_mode():
+            if self._autocast_dtype is None:
+                yield
+            else:
+                with torch.autocast("cuda", dtype=self._autocast_dtype):
+                    yield
+
+    # Embedding persistence - the first frame never changes after init_job,
+    # and the Hiera image encoder is the dominant SAM2 cost, so refines of
+    # the same frame should be prompt-only passes.
+
+    def save_embeddings(self, path: str):
+        """
+        Persist the image-encoder features cached by the last img_mask call.
+        """
+        predictor = getattr(self.sam_img, "predictor", None)
+        features = getattr(predictor, "features", None) if predictor else None
+        if features is None:
+            print("No image embeddings cached yet - run img_mask first")
+            return None
+        torch.save({"features": features, "image_path": self._embedded_image}, path)
+        print(f"Saved image embeddings to: {path}")
+        return path
+
+    def _prime_features(self, image_path: str):
+        """
+        Run set_image() so the encoder features stay cached on the
+        predictor. The plain predict path computes features inside
+        prompt_inference without storing them, which would leave
+        save_embeddings with nothing to persist and the prompt-only
+        branch in img_mask unreachable.
+        """
+        predictor = getattr(self.sam_img, "predictor", None)
+        if predictor is None:
+            return None
+        try:
+            predictor.set_image(image_path)
+        except Exception as e:
+            print(f"feature priming failed ({e}) - refines will re-encode")
+            return None
+        return predictor
+
+    def load_embeddings(self, path: str) -> bool:
+        """
+        Restore saved encoder features into the predictor so the next
+        prompted img_mask on the same image skips the encoder.
+        """
+        if not os.path.exists(path):
+            return False
+        predictor = getattr(self.sam_img, "predictor", None)
+        if predictor is None:
+            # the ultralytics wrapper builds its predictor on first predict;
+            # nothing to attach features to yet
+            print("Predictor not initialized - embeddings will be recomputed")
+            return False
+        data = torch.load(path, map_location="cpu")
+        predictor.features = data["features"]
+        self._embedded_image = data.get("image_path")
+        print(f"Loaded image embeddings from: {path}")
+        return True
+
     # Mask ARRAY generators
 
     def img_mask(self, image_path: str, output_dir: str = None, points: Optional[List[List[int]]] = None, labels: Optional[List[int]] = None) -> np.ndarray:
         """
         predict with SAM single-frame
         """
-        # SAM2 image predictor usage - correct format
-        if points and labels:
-            result = self.sam_img(image_path, points=points, labels=labels)
-        else:
-            result = self.sam_img(image_path)
+        predictor = getattr(self.sam_img, "predictor", None)
+        with self._inference_ctx():
+            if (points and labels and predictor is not None
+                    and self._embedded_image == image_path
+                    and getattr(predictor, "features", None) is not None):
+                # encoder features still valid for this image - prompt-only pass
+                result = predictor(points=points, labels=labels)
+            elif points and labels and predictor is not None:
+                # encode once via set_image (cached on the predictor), then
+                # a prompt-only pass; the plain predict path would compute
+                # the same features and throw them away
+                self._prime_features(image_path)
+                result = predictor(points=points, labels=labels)
+                self._embedded_image = image_path
+            # SAM2 image predictor usage - correct format
+            elif points and labels:
+                # first call in the process: the wrapper builds its
+                # predictor lazily inside predict, so prime features after
+                result = self.sam_img(image_path, points=points, labels=labels)
+                self._prime_features(image_path)
+                self._embedded_image = image_path
+            else:
+                result = self.sam_img(image_path)
+                self._prime_features(image_path)
+                self._embedded_image = image_path
         # Handle SAM2 result format - it returns a list of Results objects
         if isinstance(result, list) and len(result) > 0:
             result = result[0]  # Take the first (and usually only) result
@@ -58,9 +368,8 @@ class Sam2Service:
         # Save masks as npz if output_dir is provided
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
-            # Convert to binary masks (0s and 1s) for consistency with video_mask
-            binary_masks = (masks_arr > 0).astype(np.uint8)
-            np.savez_compressed(os.path.join(output_dir, "img_masks.npz"), binary_masks)
+            # Binary masks (0s and 1s) for consistency with video_mask
+            save_masks_npz(os.path.join(output_dir, "img_masks.npz"), masks_arr)
             print(f"Saved masks to: {output_dir}/img_masks.npz")
         
         output_path = os.path.join(f"{output_dir}/img_masks.npz")
@@ -69,36 +378,164 @@ class Sam2Service:
             return merged
         return output_path
     
+    def video_mask_frames(self, video_path: str, points: Optional[List[List[int]]] = None, labels: Optional[List[int]] = None,
+                          target_size: Optional[Tuple[int, int]] = None):
+        """
+        Propagate SAM2 over the video, yielding (frame_idx, merged uint8
+        mask) as each frame's prediction lands. Streaming lets downstream
+        compositing/upload start on frame 0 instead of after the whole
+        propagation; each transfer is one OR-reduced (H,W) uint8.
+
+        target_size (H, W) resizes each mask on the GPU before transfer,
+        so consumers compositing at native image resolution skip N
+        single-threaded cv2.resize calls.
+        """
+        # Decode up front with PyAV's threaded decoder when available -
+        # otherwise the predictor's single-threaded cv2 reader serializes
+        # decode with propagation
+        source = video_path
+        if AV_AVAILABLE:
+            try:
+                source = _decode_video_frames(video_path)
+            except Exception as e:
+                print(f"PyAV decode failed, using predictor's reader: {e}")
+                source = video_path
+
+        # SAM2 video predictor usage - format points and labels correctly.
+        # Keep the per-frame iteration inside the context too: results may
+        # be a generator, so frames are produced under autocast as well.
+        with self._inference_ctx():
+            if points and labels:
+                results = self.sam_video(source, points=points, labels=labels)
+            else:
+                results = self.sam_video(source)
+
+            for i, result in enumerate(results):
+                if result.masks is not None:
+                    # OR-reduce on the GPU before the (small) transfer
+                    merged_mask = result.masks.data.any(dim=0)
+                    if (target_size is not None
+                            and tuple(merged_mask.shape) != tuple(target_size)):
+                        merged_mask = torch.nn.functional.interpolate(
+                            merged_mask[None, None].float(),
+                            size=target_size, mode="nearest")[0, 0]
+                    yield i, merged_mask.to(torch.uint8).cpu().numpy()
+
     def video_mask(self, video_path: str,job_id: str, points: Optional[List[List[int]]] = None, labels: Optional[List[int]] = None) -> np.ndarray:
         """
         predict with SAM2 video
         """
-        # SAM2 video predictor usage - format points and labels correctly
-        if points and labels:
-            results = self.sam_video(video_path, points=points, labels=labels)
-        else:
-            results = self.sam_video(video_path)
-
         output_dir = os.path.expanduser(f"~/torque/jobs/{job_id}")
         masks_dir = os.path.join(output_dir, "masks")
         os.makedirs(masks_dir, exist_ok=True)
-        
-        all_masks = []
-        for i, result in enumerate(results):
-            if result.masks is not None:
-                masks = result.masks.data.cpu().numpy() # (N, H, W)
-                
-                merged_mask = np.any(masks, axis=0).astype(np.uint8)  # (H, W)
-                all_masks.append(merged_mask)
-
-        # Save full 3D mask array: (num_frames, H, W)
-        mask_array = np.stack(all_masks)
+
+        # Write frames into one growing buffer (chunks of 256) instead of
+        # a list + np.stack, which reallocates per append and then copies
+        # the whole array once more to make it contiguous
+        buf = None
+        n_frames = 0
+        for _, mask in self.video_mask_frames(video_path, points, labels):
+            if buf is None:
+                buf = np.empty((256,) + mask.shape, dtype=np.uint8)
+            elif n_frames == len(buf):
+                buf = np.concatenate([buf, np.empty_like(buf)])
+            buf[n_frames] = mask
+            n_frames += 1
+
+        # Save full 3D mask array: (num_frames, H, W), bit-packed
+        mask_array = buf[:n_frames]
         output_path = os.path.join(masks_dir, "video_masks.npz")
-        np.savez_compressed(output_path, mask_array)
+        save_masks_npz(output_path, mask_array)
 
         print(f"Done. Saved masks to: {output_path}")
         return output_path
 
+    def process_video_pipelined(self, video_path: str, job_id: str,
+                                points: Optional[List[List[int]]] = None,
+                                labels: Optional[List[int]] = None,
+                                upload_to_s3: bool = True,
+                                s3_bucket: str = None, s3_prefix: str = None):
+        """
+        Producer-consumer pipeline over video_mask_frames: SAM2 emits one
+        mask per frame while a thread pool composites the matching RGBA
+        PNG and uploads it. Wall time approaches the slowest stage instead
+        of the sum of propagate -> composite -> upload.
+
+        Returns the same summary dict as batch_create_rgba_masks, plus
+        the saved masks path under 'masks_path'.
+        """
+        images_dir = os.path.expanduser(f"~/torque/jobs/{job_id}/images")
+        output_dir = os.path.expanduser(f"~/torque/jobs/{job_id}/rgba")
+        masks_dir = os.path.expanduser(f"~/torque/jobs/{job_id}/masks")
+
+        if not os.path.exists(images_dir):
+            raise ValueError(f"Images directory not found: {images_dir}")
+        if upload_to_s3 and not s3_bucket:
+            raise ValueError("s3_bucket is required when upload_to_s3=True")
+
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(masks_dir, exist_ok=True)
+
+        image_files, image_paths = _list_job_images(images_dir)
+
+        results = {
+            'processed': 0,
+            'errors': 0,
+            'uploaded': 0,
+            'output_files': []
+        }
+        all_masks = []
+
+        def compose_and_upload(i: int, mask: np.ndarray):
+            name, _ = os.path.splitext(image_files[i])
+            output_path = os.path.join(output_dir, f"{name}.png")
+            png = self.create_rgba_mask(image_paths[i], mask, output_path,
+                                        return_bytes=upload_to_s3)
+            if upload_to_s3:
+                # stream the in-memory bytes - no disk read-back per frame
+                s3_key = f"{s3_prefix}/{name}.png" if s3_prefix else f"{name}.png"
+                self.s3.upload_fileobj(io.BytesIO(png), s3_bucket, s3_key,
+                                       Config=_UPLOAD_CONFIG)
+                print(f"Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+                return output_path, True
+            return output_path, False
+
+        # native image size - masks resize once on the GPU instead of a
+        # per-frame cv2.resize inside create_rgba_mask
+        target_size = None
+        if image_paths:
+            first = cv2.imread(image_paths[0])
+            if first is not None:
+                target_size = first.shape[:2]
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            futures = []
+            for i, mask in self.video_mask_frames(video_path, points, labels,
+                                                  target_size=target_size):
+                all_masks.append(mask)
+                if i < len(image_files):
+                    futures.append(pool.submit(compose_and_upload, i, mask))
+            for future in futures:
+                try:
+                    output_path, uploaded = future.result()
+                    results['processed'] += 1
+                    results['output_files'].append(output_path)
+                    if uploaded:
+                        results['uploaded'] += 1
+                except Exception as e:
+                    print(f"ERROR: pipelined frame failed: {e}")
+                    results['errors'] += 1
+
+        # Side-tap: masks NPZ still lands where the rest of the pipeline
+        # (overlay, colmap prep) expects it
+        masks_path = os.path.join(masks_dir, "video_masks.npz")
+        save_masks_npz(masks_path, np.stack(all_masks))
+        results['masks_path'] = masks_path
+
+        print(f"Pipelined processing complete: {results['processed']} frames, "
+              f"{results['errors']} errors, {results['uploaded']} uploaded")
+        return results
+
     # Mask ARRAY -> IMAGE
 
     def overlay_outline(self, image_path: str, mask_path: str, out_dir: str, color: Tuple[int, int, int] = (255,0,0), thickness: float = 0.2, alpha: float = 0.3):
@@ -107,16 +544,8 @@ class Sam2Service:
         Use Case: Finetuning mask outline on 1st image.
         Should support 1 or more masks.
         """
-        # Load mask from file
-        mask_data = np.load(mask_path)
-        
-        # Extract mask array from npz file (usually stored as 'arr_0')
-        if isinstance(mask_data, np.lib.npyio.NpzFile):
-            # Get the first (and likely only) array from the npz file
-            key = list(mask_data.keys())[0]  # Usually 'arr_0'
-            masks = mask_data[key]
-        else:
-            masks = mask_data
+        # Load mask from file (bit-packed or legacy dense layout)
+        masks = load_masks_npz(mask_path)
         
         # Load image
         image = cv2.imread(image_path)
@@ -133,23 +562,23 @@ class Sam2Service:
         if masks.ndim == 2:
             # If 2D array (single mask), convert to 3D for uniform processing
             masks = masks[np.newaxis, ...]
-        
-        # Process each mask
-        for i, mask in enumerate(masks):
-            # Mask contains 0 and 1 values, convert to 0-255 for contour detection
-            mask_binary = (mask * 255).astype(np.uint8)
-            
-            # edge map
-            contours, _ = cv2.findContours(mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # translucent fill (use original mask for boolean indexing)
-            colored = np.zeros_like(image)
-            colored[mask > 0] = color
-            cv2.addWeighted(colored, alpha, overlay, 1 - alpha, 0, overlay)
-            
-            # draw outline - convert thickness to int for cv2.drawContours
-            thickness_int = max(1, int(thickness * 10)) 
-            cv2.drawContours(overlay, contours, -1, color, thickness_int)
+
+        # Merge all masks once - fill and outline become one vectorized pass
+        # each instead of a per-mask full-image temporary + blend
+        merged = np.any(masks > 0, axis=0).astype(np.uint8) * 255
+
+        # translucent fill
+        colored = np.zeros_like(image)
+        colored[merged > 0] = color
+        cv2.addWeighted(colored, alpha, overlay, 1 - alpha, 0, overlay)
+
+        # outline via morphological gradient (SIMD under the hood) with the
+        # kernel radius standing in for stroke thickness
+        thickness_int = max(1, int(thickness * 10))
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_RECT, (2 * thickness_int + 1, 2 * thickness_int + 1))
+        edge = cv2.morphologyEx(merged, cv2.MORPH_GRADIENT, kernel)
+        overlay[edge > 0] = color
         
         # Create output directory if it doesn't exist
         os.makedirs(out_dir, exist_ok=True)
@@ -166,49 +595,89 @@ class Sam2Service:
         
         return output_path
     
-    def create_rgba_mask(self, image_path: str, mask: np.ndarray, output_path: str):
+    def create_rgba_mask(self, image_path: str, mask: np.ndarray, output_path: str, return_bytes: bool = False):
         """
         Create an RGBA PNG using a single mask as the alpha channel.
-        
+
         Args:
             image_path: Path to the input image
             mask: 2D numpy array mask (H, W) with 0s and 1s
             output_path: Path where the RGBA PNG will be saved
-        
+            return_bytes: Also return the encoded PNG bytes, so callers
+                uploading the frame skip re-reading it from disk
+
         Returns:
-            str: Path to the saved RGBA PNG file
+            str: Path to the saved RGBA PNG file (or the PNG bytes when
+            return_bytes is True)
         """
-        # Load image
-        image = cv2.imread(image_path)
+        # Load image (nvJPEG on CUDA hosts for JPEG sources)
+        image = _decode_image_bgr(image_path)
         if image is None:
             raise ValueError(f"Could not load image from {image_path}")
-        
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
+
         # Ensure mask dimensions match image dimensions
-        img_height, img_width = image_rgb.shape[:2]
+        img_height, img_width = image.shape[:2]
         if mask.shape != (img_height, img_width):
-            # Resize mask to match image dimensions
-            mask = cv2.resize(mask.astype(np.float32), (img_width, img_height), interpolation=cv2.INTER_NEAREST)
-        
-        # Convert mask to 0-255 range for alpha channel
-        alpha_channel = (mask > 0).astype(np.uint8) * 255
-        
-        # Create RGBA image by adding alpha channel
-        rgba_image = np.dstack((image_rgb, alpha_channel))
-        
+            # Resize mask to match image dimensions - nearest-neighbor on
+            # uint8 directly; the old float32 cast quadrupled the bytes moved
+            mask = cv2.resize(np.ascontiguousarray(mask, dtype=np.uint8),
+                              (img_width, img_height),
+                              interpolation=cv2.INTER_NEAREST)
+
+        # Assemble BGRA into one preallocated buffer - cv2.imwrite takes
+        # BGRA directly, so no cvtColor, dstack temporary, or PIL round-trip
+        bgra = np.empty((img_height, img_width, 4), dtype=np.uint8)
+        if NUMBA_AVAILABLE:
+            # fused jit kernel: copy + threshold in one prange pass
+            _bgra_fill(image, mask, bgra)
+        else:
+            bgra[..., :3] = image
+            np.greater(mask, 0, out=bgra[..., 3])
+            bgra[..., 3] *= 255
+
         # Output directory is already created by batch function - no need to create for each image
-    
-        # Save as PNG
-        from PIL import Image
-        pil_image = Image.fromarray(rgba_image, 'RGBA')
-        pil_image.save(output_path, 'PNG')
-        
+        # compression level 1: ~5x faster encode for ~15% larger files, a
+        # good trade for write-once frames headed to S3/COLMAP. Encode to
+        # memory so the bytes can feed both the disk write (COLMAP reads
+        # the file later) and a direct S3 upload without a read-back.
+        ok, buf = cv2.imencode('.png', bgra, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError(f"PNG encode failed for {output_path}")
+        with open(output_path, 'wb') as f:
+            f.write(buf)
+
         print(f"Saved RGBA image to: {output_path}")
-        
+
+        if return_bytes:
+            return buf.tobytes()
         return output_path
     
+    def _upload_outputs(self, output_files: List[str], s3_bucket: str, s3_prefix: str) -> int:
+        """
+        Upload rendered RGBA files to S3 concurrently. Serial uploads cost
+        the sum of per-request latencies; 16 in-flight PUTs saturate the
+        NIC instead. Returns the number of successful uploads.
+        """
+        def upload_one(output_path: str) -> str:
+            filename = os.path.basename(output_path)
+            s3_key = f"{s3_prefix}/{filename}" if s3_prefix else filename
+            self.s3.upload_file(output_path, s3_bucket, s3_key,
+                                Config=_UPLOAD_CONFIG)
+            return s3_key
+
+        uploaded = 0
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            futures = {pool.submit(upload_one, p): p for p in output_files}
+            for future in as_completed(futures):
+                try:
+                    s3_key = future.result()
+                    print(f"Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+                    uploaded += 1
+                except Exception as e:
+                    name = os.path.basename(futures[future])
+                    print(f"ERROR: S3 upload failed for {name}: {e}")
+        return uploaded
+
     def batch_create_rgba_masks_optimized(self, job_id: str, upload_to_s3: bool = True, s3_bucket: str = None, s3_prefix: str = None):
         """
         high-performance batch rgba processing using c++ optimization when available.
@@ -236,50 +705,34 @@ class Sam2Service:
         if upload_to_s3 and not s3_bucket:
             raise ValueError("s3_bucket is required when upload_to_s3=True")
         
-        # load video masks array (same as original)
-        mask_data = np.load(video_masks_path)
-        if isinstance(mask_data, np.lib.npyio.NpzFile):
-            key = list(mask_data.keys())[0]
-            video_masks = mask_data[key]
-        else:
-            video_masks = mask_data
+        # load video masks array (bit-packed or legacy dense layout)
+        video_masks = load_masks_npz(video_masks_path)
         
         # create output directory
         os.makedirs(output_dir, exist_ok=True)
         
         # get image files (same sorting as original)
-        image_files = [f for f in os.listdir(images_dir) 
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png', '.heic')) 
-                      and not f.endswith('_video.mp4')]
-        image_files.sort()
-        
+        image_files, image_paths = _list_job_images(images_dir)
+
         print(f"c++ processing: {len(image_files)} images, masks shape: {video_masks.shape}")
-        
+
         # validate counts
         if len(image_files) != video_masks.shape[0]:
             raise ValueError(f"mismatch: {len(image_files)} images but {video_masks.shape[0]} masks")
-        
-        # prepare file paths for c++ processing
-        image_paths = [os.path.join(images_dir, img_file) for img_file in image_files]
-        output_paths = [os.path.join(output_dir, f"{os.path.splitext(img_file)[0]}.png") 
+
+        # prepare output paths for c++ processing
+        output_paths = [os.path.join(output_dir, f"{os.path.splitext(img_file)[0]}.png")
                        for img_file in image_files]
         
         try:
             # call c++ optimized batch processing
             cpp_results = torque_cpp.batch_rgba(image_paths, video_masks, output_paths)
             
-            # handle s3 uploads (same as original python method)
+            # handle s3 uploads (concurrent, same as the python method)
             uploaded_count = 0
             if upload_to_s3:
-                for output_file in cpp_results['output_files']:
-                    try:
-                        filename = os.path.basename(output_file)
-                        s3_key = f"{s3_prefix}/{filename}" if s3_prefix else filename
-                        self.s3.upload_file(output_file, s3_bucket, s3_key)
-                        uploaded_count += 1
-                        print(f"uploaded: s3://{s3_bucket}/{s3_key}")
-                    except Exception as e:
-                        print(f"s3 upload failed for {filename}: {e}")
+                uploaded_count = self._upload_outputs(
+                    cpp_results['output_files'], s3_bucket, s3_prefix)
             
             # format results to match original python method
             results = {
@@ -330,20 +783,14 @@ class Sam2Service:
             raise ValueError("s3_bucket is required when upload_to_s3=True")
         
         # Load video masks array (num_frames, H, W)
-        mask_data = np.load(video_masks_path)
-        if isinstance(mask_data, np.lib.npyio.NpzFile):
-            key = list(mask_data.keys())[0]  # Usually 'arr_0'
-            video_masks = mask_data[key]
-        else:
-            video_masks = mask_data
+        video_masks = load_masks_npz(video_masks_path)
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
         # Get all image files (already sorted by init_job as 0001.png, 0002.png, etc.)
-        image_files = [f for f in os.listdir(images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.heic')) and not f.endswith('_video.mp4')]
-        image_files.sort()  # Sequential ordering maintained
-        
+        image_files, image_paths = _list_job_images(images_dir)
+
         print(f"Processing {len(image_files)} images for job {job_id}")
         print(f"Video masks shape: {video_masks.shape}")
         
@@ -357,38 +804,37 @@ class Sam2Service:
             'uploaded': 0,
             'output_files': []
         }
-        
-        for i, image_filename in enumerate(image_files):
-            try:
-                # Paths - maintain sequential naming convention
-                image_path = os.path.join(images_dir, image_filename)
-                name, _ = os.path.splitext(image_filename)
-                output_filename = f"{name}.png"  # Keep same numbering: 0001.png -> 0001.png
-                output_path = os.path.join(output_dir, output_filename)
-                
-                # Get the corresponding mask for this image
-                mask_for_image = video_masks[i]  # Shape: (H, W)
-                
-                # Create RGBA mask using the specific mask for this image
-                self.create_rgba_mask(image_path, mask_for_image, output_path)
-                results['processed'] += 1
-                results['output_files'].append(output_path)
-                
-                # Upload to S3 if requested
-                if upload_to_s3:
-                    try:
-                        s3_key = f"{s3_prefix}/{output_filename}" if s3_prefix else output_filename
-                        self.s3.upload_file(output_path, s3_bucket, s3_key)
-                        print(f"Uploaded to S3: s3://{s3_bucket}/{s3_key}")
-                        results['uploaded'] += 1
-                    except Exception as e:
-                        print(f"ERROR: S3 upload failed for {output_filename}: {e}")
-                
-            except Exception as e:
-                print(f"ERROR: Error processing {image_filename}: {e}")
-                results['errors'] += 1
-                continue
-        
+
+        def process_one(i: int, image_filename: str):
+            # Paths - maintain sequential naming convention
+            name, _ = os.path.splitext(image_filename)
+            output_filename = f"{name}.png"  # Keep same numbering: 0001.png -> 0001.png
+            output_path = os.path.join(output_dir, output_filename)
+
+            # Create RGBA mask using the specific mask for this image
+            self.create_rgba_mask(image_paths[i], video_masks[i], output_path)
+            return output_filename, output_path
+
+        # PNG decode/encode release the GIL, so a thread pool overlaps the
+        # per-image imread + imwrite instead of running them serially
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            futures = [pool.submit(process_one, i, f)
+                       for i, f in enumerate(image_files)]
+            for image_filename, future in zip(image_files, futures):
+                try:
+                    output_filename, output_path = future.result()
+                    results['processed'] += 1
+                    results['output_files'].append(output_path)
+                except Exception as e:
+                    print(f"ERROR: Error processing {image_filename}: {e}")
+                    results['errors'] += 1
+
+        # Upload to S3 if requested (concurrent - see _upload_outputs)
+        if upload_to_s3:
+            results['uploaded'] = self._upload_outputs(
+                results['output_files'], s3_bucket, s3_prefix)
+
+
         print(f"Batch processing complete:")
         print(f"   Processed: {results['processed']}/{len(image_files)}")
         print(f"   Errors: {results['errors']}")
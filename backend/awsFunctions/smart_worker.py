@@ -7,24 +7,51 @@ runs the complete torque pipeline with intelligent shutdown:
 - auto-shutdown after 2 hours OR when no jobs remain
 - integrates with existing ec2 setup and pipeline scripts
 """
+import collections
+import importlib
+import threading
 import time
-import subprocess
 import os
 import json
 import boto3
+import requests
+from botocore.config import Config as BotoConfig
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 import signal
 import sys
 
+# stages that own the GPU - only one job may run these at a time.
+# init_job belongs here too: it runs SAM2 inference (first-frame mask +
+# the encoder warm-up on first construction), and the ultralytics
+# predictors behind the shared Sam2Service are not thread-safe.
+GPU_STEPS = {"init_job", "run_sam2", "run_colmap", "run_brush"}
+
+# AWS clients pinned at module scope: credential resolution and endpoint
+# discovery happen once per process, and tcp_keepalive keeps the pooled
+# connections warm across a daemon lifetime of SQS polls. read_timeout
+# stays above the 20 s long-poll wait.
+_AWS_CONFIG = BotoConfig(
+    tcp_keepalive=True,
+    max_pool_connections=20,
+    connect_timeout=3,
+    read_timeout=30,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+)
+_SQS = boto3.client('sqs', config=_AWS_CONFIG)
+_EC2 = boto3.client('ec2', config=_AWS_CONFIG)
+
 
 class SmartWorker:
     """intelligent single-instance worker with auto-shutdown"""
     
     def __init__(self):
-        # aws clients
-        self.sqs = boto3.client('sqs')
-        self.ec2 = boto3.client('ec2')
+        # aws clients (module-level singletons - see _AWS_CONFIG above)
+        self.sqs = _SQS
+        self.ec2 = _EC2
         
         # config from environment
         self.queue_url = os.getenv('TORQUE_SQS_QUEUE_URL')
@@ -32,6 +59,19 @@ class SmartWorker:
         self.fastapi_token = os.getenv('FASTAPI_TOKEN')
         self.bucket = os.getenv('TORQUE_S3_BUCKET', 'torque-jobs')
         
+        # one keep-alive session for all backend calls - amortizes the TLS
+        # handshake across the many PATCHes a session issues
+        self.http = requests.Session()
+        self.http.headers.update({
+            "Authorization": f"Bearer {self.fastapi_token}",
+            "Content-Type": "application/json"
+        })
+        self.http.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
+
         # runtime limits
         self.max_runtime_hours = 2
         self.idle_shutdown_minutes = 5
@@ -40,7 +80,15 @@ class SmartWorker:
         # instance info
         self.instance_id = self._get_instance_id()
         
+        # job concurrency: overlap one job's S3/HTTP waits with another's
+        # compute; the GPU semaphore keeps the heavy stages exclusive
+        self.job_concurrency = int(os.getenv('TORQUE_JOB_CONCURRENCY', '2'))
+        self._executor = ThreadPoolExecutor(max_workers=self.job_concurrency)
+        self._gpu_lock = threading.Semaphore(1)
+
         # job processing state
+        self._pending_jobs = collections.deque()  # messages from batched receives
+        self._stage_state = {}  # job_id -> accumulated stage_status flags
         self.current_job_id = None
         self.jobs_processed = 0
         self.last_job_time = time.time()
@@ -56,17 +104,41 @@ class SmartWorker:
         print(f"  max runtime: {self.max_runtime_hours} hours")
         print(f"  idle shutdown: {self.idle_shutdown_minutes} minutes")
     
+    _INSTANCE_ID_CACHE = "/var/run/torque_instance_id"
+
     def _get_instance_id(self) -> str:
-        """get ec2 instance id from metadata"""
+        """get ec2 instance id via IMDSv2, cached locally across restarts"""
+        # local cache first - restarts skip the metadata round-trip
         try:
-            import requests
+            with open(self._INSTANCE_ID_CACHE) as f:
+                cached = f.read().strip()
+            if cached:
+                return cached
+        except OSError:
+            pass
+
+        try:
+            # IMDSv2: session token first (v1 is disabled on many images)
+            token = requests.put(
+                'http://169.254.169.254/latest/api/token',
+                headers={'X-aws-ec2-metadata-token-ttl-seconds': '21600'},
+                timeout=1
+            ).text
             response = requests.get(
                 'http://169.254.169.254/latest/meta-data/instance-id',
+                headers={'X-aws-ec2-metadata-token': token},
                 timeout=2
             )
-            return response.text
-        except:
+            instance_id = response.text
+        except requests.RequestException:
             return "unknown-instance"
+
+        try:
+            with open(self._INSTANCE_ID_CACHE, 'w') as f:
+                f.write(instance_id)
+        except OSError:
+            pass  # unwritable /var/run - just skip the cache
+        return instance_id
     
     def _signal_handler(self, signum, frame):
         """handle shutdown signals gracefully"""
@@ -76,38 +148,64 @@ class SmartWorker:
     def run(self):
         """main worker loop with intelligent shutdown"""
         print("starting smart worker loop...")
-        
+
+        in_flight = {}  # future -> job message
+        forced = False  # hard deadline hit with jobs still running
         try:
             while not self.shutdown_requested:
-                # check shutdown conditions
-                if self._should_shutdown():
+                # reap finished jobs
+                for future in [f for f in in_flight if f.done()]:
+                    job_message = in_flight.pop(future)
+                    job_id = job_message['job'].get('job_id')
+                    try:
+                        if future.result():
+                            self.jobs_processed += 1
+                            self.last_job_time = time.time()
+                            print(f"completed job {job_id} (total: {self.jobs_processed})")
+                        else:
+                            print(f"job {job_id} failed")
+                    except Exception as e:
+                        print(f"job {job_id} crashed: {e}")
+
+                # check shutdown conditions (never while jobs are running)
+                if not in_flight and self._should_shutdown():
                     break
-                
-                # get next job from queue
-                job_message = self._receive_job()
-                
-                if job_message:
-                    # process the job
-                    success = self._process_complete_job(job_message)
-                    
-                    if success:
-                        self.jobs_processed += 1
-                        self.last_job_time = time.time()
-                        print(f"completed job {self.current_job_id} (total: {self.jobs_processed})")
-                    else:
-                        print(f"job {self.current_job_id} failed")
-                    
-                    self.current_job_id = None
-                else:
-                    # no jobs available - short sleep
-                    print("no jobs available, waiting...")
-                    time.sleep(30)
-            
+
+                # hard deadline: even with jobs in flight, never outlive
+                # max runtime by more than an hour - a wedged step would
+                # otherwise keep the instance (and the bill) up forever
+                runtime = time.time() - self.start_time
+                if runtime > (self.max_runtime_hours + 1) * 3600:
+                    print(f"shutdown: hard runtime deadline with "
+                          f"{len(in_flight)} job(s) still in flight")
+                    forced = True
+                    break
+
+                if len(in_flight) < self.job_concurrency:
+                    job_message = self._receive_job(
+                        self.job_concurrency - len(in_flight))
+                    if job_message:
+                        future = self._executor.submit(
+                            self._process_complete_job, job_message)
+                        in_flight[future] = job_message
+                        continue
+                    if not in_flight:
+                        # no jobs available - short sleep
+                        print("no jobs available, waiting...")
+                        time.sleep(30)
+                        continue
+
+                # all slots busy (or queue empty with jobs still running)
+                wait(list(in_flight), return_when=FIRST_COMPLETED, timeout=30)
+
             print(f"worker loop ended - processed {self.jobs_processed} jobs")
-            
+
         except Exception as e:
             print(f"worker loop error: {e}")
         finally:
+            # on a forced exit don't wait for wedged steps - the instance
+            # stop below tears them down with everything else
+            self._executor.shutdown(wait=not forced)
             self._shutdown_instance()
     
     def _should_shutdown(self) -> bool:
@@ -128,29 +226,36 @@ class SmartWorker:
         
         return False
     
-    def _receive_job(self) -> Optional[Dict[str, Any]]:
-        """receive next job from sqs queue"""
+    def _receive_job(self, max_messages: int = 1) -> Optional[Dict[str, Any]]:
+        """receive next job - drains the local buffer before polling sqs"""
+        # batched receives skip the 20-second poll gap between jobs that
+        # start back to back
+        if self._pending_jobs:
+            return self._pending_jobs.popleft()
+
         try:
             response = self.sqs.receive_message(
                 QueueUrl=self.queue_url,
-                MaxNumberOfMessages=1,
+                # never pull more than the free worker slots: jobs run on
+                # the order of an hour, so anything parked in the local
+                # buffer would outlive the SQS visibility timeout, get
+                # redelivered, and re-run with a stale receipt handle
+                MaxNumberOfMessages=max(1, min(10, max_messages)),
                 WaitTimeSeconds=20,  # long polling
                 MessageAttributeNames=['All']
             )
-            
-            messages = response.get('Messages', [])
-            if not messages:
+
+            for message in response.get('Messages', []):
+                self._pending_jobs.append({
+                    'job': json.loads(message['Body']),
+                    'receipt_handle': message['ReceiptHandle'],
+                    'message_id': message['MessageId']
+                })
+
+            if not self._pending_jobs:
                 return None
-            
-            message = messages[0]
-            job_data = json.loads(message['Body'])
-            
-            return {
-                'job': job_data,
-                'receipt_handle': message['ReceiptHandle'],
-                'message_id': message['MessageId']
-            }
-            
+            return self._pending_jobs.popleft()
+
         except Exception as e:
             print(f"error receiving job: {e}")
             return None
@@ -160,8 +265,8 @@ class SmartWorker:
         job = job_message['job']
         receipt_handle = job_message['receipt_handle']
         
-        self.current_job_id = job['job_id']
-        job_id = self.current_job_id
+        job_id = job['job_id']
+        self.current_job_id = job_id  # most recently started (for logs)
         video_url = job['video_url']
         user_id = job['user_id']
         
@@ -175,46 +280,49 @@ class SmartWorker:
                 "started_at": datetime.now().isoformat()
             })
             
+            # stage flags accumulate locally and flush in one PATCH with
+            # the completed/failed transition - each intermediate PATCH
+            # was a blocking TLS round-trip that told the frontend nothing
+            # it couldn't learn from the final state
+            self._stage_state[job_id] = {}
+
             # step 1: init_job
             print(f"step 1/6: init_job for {job_id}")
             if not self._run_pipeline_step("init_job", job_id, video_url):
                 raise Exception("init_job failed")
-            
-            self._patch_job_status(job_id, "processing", {"stage_status": {"init_done": True}})
-            
+            self._stage_state[job_id]["init_done"] = True
+
             # step 2: refine_mask (interactive - skip for now or use defaults)
             print(f"step 2/6: refine_mask for {job_id} (using defaults)")
             # for automated processing, we'll skip interactive refinement
             # or could implement auto-refinement based on initial sam2 results
-            
-            # step 3: run_sam2  
+
+            # step 3: run_sam2
             print(f"step 3/6: run_sam2 for {job_id}")
             if not self._run_pipeline_step("run_sam2", job_id):
                 raise Exception("run_sam2 failed")
-            
-            self._patch_job_status(job_id, "processing", {"stage_status": {"sam2_done": True}})
-            
+            self._stage_state[job_id]["sam2_done"] = True
+
             # step 4: run_colmap
             print(f"step 4/6: run_colmap for {job_id}")
             if not self._run_pipeline_step("run_colmap", job_id):
                 raise Exception("run_colmap failed")
-            
-            self._patch_job_status(job_id, "processing", {"stage_status": {"colmap_done": True}})
-            
+            self._stage_state[job_id]["colmap_done"] = True
+
             # step 5: run_brush
             print(f"step 5/6: run_brush for {job_id}")
             if not self._run_pipeline_step("run_brush", job_id):
                 raise Exception("run_brush failed")
-            
-            self._patch_job_status(job_id, "processing", {"stage_status": {"brush_done": True}})
-            
+            self._stage_state[job_id]["brush_done"] = True
+
             # step 6: cleanup_job
             print(f"step 6/6: cleanup_job for {job_id}")
             if not self._run_pipeline_step("cleanup_job", job_id):
                 print("warning: cleanup_job failed, but job completed")
-            
-            # mark job as completed
+
+            # mark job as completed (single PATCH carries all stage flags)
             self._patch_job_status(job_id, "completed", {
+                "stage_status": self._stage_state.pop(job_id),
                 "completed_at": datetime.now().isoformat(),
                 "worker_instance_id": self.instance_id
             })
@@ -231,8 +339,9 @@ class SmartWorker:
         except Exception as e:
             print(f"job {job_id} failed: {e}")
             
-            # mark job as failed
+            # mark job as failed, including which stages had finished
             self._patch_job_status(job_id, "failed", {
+                "stage_status": self._stage_state.pop(job_id, {}),
                 "error_message": str(e),
                 "failed_at": datetime.now().isoformat(),
                 "worker_instance_id": self.instance_id
@@ -242,75 +351,44 @@ class SmartWorker:
             return False
     
     def _run_pipeline_step(self, step_name: str, job_id: str, video_url: str = None) -> bool:
-        """run a specific pipeline step script"""
+        """
+        run a pipeline step in-process via its run_step entrypoint.
+
+        forking python3 per step paid interpreter startup plus cold
+        boto3/torch imports five times per job; importing once keeps the
+        SAM2 weights and AWS clients warm across jobs. COLMAP and Brush
+        still exec their native binaries inside their steps, so crashes
+        there stay isolated from the worker.
+        """
+        if step_name not in ("init_job", "run_sam2", "run_colmap",
+                             "run_brush", "cleanup_job"):
+            print(f"unknown pipeline step: {step_name}")
+            return False
+
         try:
-            # construct command based on step
-            if step_name == "init_job":
-                cmd = [
-                    'python3', 'init_job.py',
-                    '--job_id', job_id,
-                    '--video_url', video_url,
-                    '--bucket', self.bucket,
-                    '--fastapi_url', self.fastapi_url,
-                    '--fastapi_token', self.fastapi_token
-                ]
-            elif step_name == "run_sam2":
-                cmd = [
-                    'python3', 'run_sam2.py',
-                    '--job_id', job_id,
-                    '--bucket', self.bucket,
-                    '--fastapi_url', self.fastapi_url,
-                    '--fastapi_token', self.fastapi_token
-                ]
-            elif step_name == "run_colmap":
-                cmd = [
-                    'python3', 'run_colmap.py',
-                    '--job_id', job_id,
-                    '--bucket', self.bucket,
-                    '--fastapi_url', self.fastapi_url,
-                    '--fastapi_token', self.fastapi_token
-                ]
-            elif step_name == "run_brush":
-                cmd = [
-                    'python3', 'run_brush.py',
-                    '--job_id', job_id,
-                    '--bucket', self.bucket,
-                    '--fastapi_url', self.fastapi_url,
-                    '--fastapi_token', self.fastapi_token
-                ]
-            elif step_name == "cleanup_job":
-                cmd = [
-                    'python3', 'cleanup_job.py',
-                    '--job_id', job_id,
-                    '--bucket', self.bucket
-                ]
+            module = importlib.import_module(step_name)
+
+            kwargs = {'job_id': job_id, 'bucket': self.bucket}
+            if step_name != "cleanup_job":
+                kwargs['fastapi_url'] = self.fastapi_url
+                kwargs['fastapi_token'] = self.fastapi_token
+            if step_name == "init_job" and video_url:
+                kwargs['video_url'] = video_url
+
+            print(f"running {step_name} for {job_id} (in-process)")
+
+            # GPU-bound stages take the semaphore so concurrent jobs only
+            # overlap their IO-bound portions
+            if step_name in GPU_STEPS:
+                with self._gpu_lock:
+                    success = bool(module.run_step(**kwargs))
             else:
-                raise ValueError(f"unknown pipeline step: {step_name}")
-            
-            # run the command
-            print(f"running: {' '.join(cmd)}")
-            result = subprocess.run(
-                cmd,
-                check=True,
-                capture_output=True,
-                text=True,
-                timeout=3600  # 1 hour timeout per step
-            )
-            
-            print(f"{step_name} completed successfully")
-            if result.stdout:
-                print(f"stdout: {result.stdout[-500:]}")  # last 500 chars
-            
-            return True
-            
-        except subprocess.CalledProcessError as e:
-            print(f"{step_name} failed with exit code {e.returncode}")
-            print(f"stdout: {e.stdout}")
-            print(f"stderr: {e.stderr}")
-            return False
-        except subprocess.TimeoutExpired:
-            print(f"{step_name} timed out after 1 hour")
-            return False
+                success = bool(module.run_step(**kwargs))
+
+            if success:
+                print(f"{step_name} completed successfully")
+            return success
+
         except Exception as e:
             print(f"{step_name} error: {e}")
             return False
@@ -318,21 +396,14 @@ class SmartWorker:
     def _patch_job_status(self, job_id: str, status: str, additional_data: Dict[str, Any] = None):
         """update job status via fastapi"""
         try:
-            import requests
-            
             data = {"status": status}
             if additional_data:
                 data.update(additional_data)
-            
-            headers = {
-                "Authorization": f"Bearer {self.fastapi_token}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.patch(
+
+            # auth headers live on the shared session
+            response = self.http.patch(
                 f"{self.fastapi_url}/jobs/{job_id}/status",
                 json=data,
-                headers=headers,
                 timeout=30
             )
             
@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
 import os
 import uuid
 import json
@@ -63,13 +64,18 @@ async def upload_video(file: UploadFile = File(...)):
     # Create session ID and save video
     session_id = str(uuid.uuid4())
     video_path = UPLOAD_DIR / f"{session_id}_{file.filename}"
-    
-    with open(video_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+
+    # copy + model init are blocking; run them off the event loop so a
+    # multi-hundred-MB upload doesn't starve every other request
+    def save_upload():
+        with open(video_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+
+    await asyncio.to_thread(save_upload)
+
     # Initialize SAM2 manager
     try:
-        sam_manager = SAM2VideoManager(str(video_path))
+        sam_manager = await asyncio.to_thread(SAM2VideoManager, str(video_path))
         sessions[session_id] = sam_manager
         
         # Get video info
@@ -128,7 +134,9 @@ async def propagate_masks(session_id: str, request: PropagationRequest):
         raise HTTPException(status_code=404, detail="Session not found")
     
     try:
-        result = sessions[session_id].propagate_masks(
+        # propagation runs minutes of GPU work - keep it off the event loop
+        result = await asyncio.to_thread(
+            sessions[session_id].propagate_masks,
             start_frame=request.start_frame,
             end_frame=request.end_frame
         )